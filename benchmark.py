@@ -0,0 +1,375 @@
+"""
+End-to-end pipeline benchmark with a local Ollama and RSS stand-in.
+
+Starts a fake Ollama /api/chat server (configurable latency and token rate)
+that also serves generated RSS fixtures, runs main.main() against it with
+state in a temporary directory and prints per-stage timings (from the run's
+metrics spans), throughput and peak memory as JSON.
+
+    python benchmark.py --scales 10 100 1000 --latency 0.2 --token-rate 200
+    python benchmark.py --stream
+    python benchmark.py --output bench.json
+    python benchmark.py --compare bench.json --tolerance 0.25
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import re
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.sax.saxutils import escape
+
+import config
+
+DEFAULT_SCALES = [10, 100, 1000, 5000]
+
+_TOPICS = [
+    "contract validation", "predictive maintenance", "invoice classification", "document approval",
+    "risk scoring", "capital planning", "compliance auditing", "supply chain forecasting",
+    "customer support triage", "fraud detection", "project scheduling", "asset inspection",
+]
+_FILLER = (
+    "Enterprises are adopting large language models to automate workflows and cut costs. "
+    "The new release adds retrieval, agents and fine-tuning options for regulated industries. "
+)
+
+
+# ================================
+# RSS fixtures
+# ================================
+
+def make_feed(size: int, seed: int = 42) -> str:
+    """Generate an RSS document with `size` items; about 10% are cross-posted copies."""
+    rng = random.Random(seed + size)
+    items = []
+    for i in range(size):
+        topic = rng.choice(_TOPICS)
+        story = i if rng.random() > 0.1 or i == 0 else rng.randrange(i)
+        title = f"Story {story}: AI for {topic} reaches enterprises"
+        summary = (f"<p><strong>{title}.</strong> {_FILLER * rng.randint(1, 4)}"
+                   f"<a href='https://example.com/{story}'>Read more</a></p>")
+        items.append(
+            f"<item><title>{escape(title)}</title>"
+            f"<link>https://news.example.com/{i}?utm_source=rss</link>"
+            f"<description>{escape(summary)}</description></item>"
+        )
+    return ('<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel>'
+            f"<title>Benchmark feed ({size})</title>{''.join(items)}</channel></rss>")
+
+
+# ================================
+# Fake Ollama server
+# ================================
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    """Serves /api/chat like Ollama and /feeds/<n>.xml fixtures."""
+
+    protocol_version = "HTTP/1.1"
+    latency = 0.05  # seconds before the first token (prompt evaluation)
+    token_rate = 500.0  # generated tokens per second
+    feeds = {}
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body: bytes, content_type="application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        match = re.fullmatch(r"/feeds/(\d+)\.xml", self.path)
+        if match and int(match.group(1)) in self.feeds:
+            self._send(200, self.feeds[int(match.group(1))], "application/rss+xml")
+        else:
+            self._send(404, b"{}")
+
+    def do_POST(self):
+        if self.path != "/api/chat":
+            self._send(404, b"{}")
+            return
+
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        messages = payload.get("messages") or []
+        prompt = messages[-1]["content"] if messages else ""
+        started = time.perf_counter()
+
+        if not prompt:
+            # Model load / keep-alive request
+            self._send(200, json.dumps({"model": payload.get("model"), "done": True}).encode())
+            return
+
+        text = self._answer(prompt)
+        if not payload.get("format"):
+            # Unconstrained models tend to add prose after the JSON
+            text += "\n\nThese use cases reflect current enterprise AI trends."
+        tokens = [text[i:i + 4] for i in range(0, len(text), 4)]
+        time.sleep(self.latency)
+
+        def stats():
+            elapsed = time.perf_counter() - started
+            return {"done": True, "prompt_eval_count": len(prompt) // 4, "eval_count": len(tokens),
+                    "prompt_eval_duration": int(self.latency * 1e9), "total_duration": int(elapsed * 1e9),
+                    "eval_duration": int(max(0.0, elapsed - self.latency) * 1e9)}
+
+        if not payload.get("stream"):
+            time.sleep(len(tokens) / self.token_rate)
+            body = {"model": payload.get("model"), "message": {"role": "assistant", "content": text}}
+            body.update(stats())
+            self._send(200, json.dumps(body).encode())
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for token in tokens:
+                time.sleep(1.0 / self.token_rate)
+                self._chunk({"message": {"role": "assistant", "content": token}, "done": False})
+            self._chunk(stats())
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # Client stopped early once it had a complete JSON value
+            self.close_connection = True
+
+    def _chunk(self, obj):
+        data = (json.dumps(obj) + "\n").encode()
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    @staticmethod
+    def _answer(prompt: str) -> str:
+        topics = [t for t in _TOPICS if t in prompt.lower()] or _TOPICS[:2]
+        if "### Article" in prompt:
+            ids = re.findall(r"### Article (\d+)", prompt)
+            return json.dumps({i: [f"AI-powered {t}" for t in topics[:2]] for i in ids})
+        if "Use Cases:" in prompt:
+            count = max(1, prompt.count("\n- ") // 4)
+            return json.dumps([f"Intelligent {_TOPICS[i % len(_TOPICS)]} module" for i in range(count)])
+        return json.dumps([f"AI-powered {t}" for t in topics] + [f"Automated {topics[0]} for enterprises"])
+
+
+class _SmtpSinkHandler(socketserver.StreamRequestHandler):
+    """Minimal SMTP server that accepts and discards messages."""
+
+    def handle(self):
+        self.wfile.write(b"220 benchmark ESMTP\r\n")
+        in_data = False
+        for raw in self.rfile:
+            line = raw.rstrip(b"\r\n")
+            if in_data:
+                if line == b".":
+                    in_data = False
+                    self.wfile.write(b"250 OK\r\n")
+                continue
+            command = line[:4].upper()
+            if command == b"EHLO":
+                self.wfile.write(b"250 benchmark\r\n")
+            elif command == b"DATA":
+                in_data = True
+                self.wfile.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+            elif command == b"QUIT":
+                self.wfile.write(b"221 Bye\r\n")
+                return
+            else:
+                self.wfile.write(b"250 OK\r\n")
+
+
+class _QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients dropping idle keep-alive connections at shutdown are expected
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class _ThreadingTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def start_servers(latency: float, token_rate: float, scales):
+    FakeOllamaHandler.latency = latency
+    FakeOllamaHandler.token_rate = token_rate
+    FakeOllamaHandler.feeds = {size: make_feed(size).encode() for size in scales}
+
+    http_server = _QuietHTTPServer(("127.0.0.1", 0), FakeOllamaHandler)
+    smtp_server = _ThreadingTCPServer(("127.0.0.1", 0), _SmtpSinkHandler)
+    for server in (http_server, smtp_server):
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    return http_server, smtp_server
+
+
+# ================================
+# Pipeline run
+# ================================
+
+def _write_sources(path: str, base_url: str, size: int):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f'[[source]]\nname = "Benchmark"\nurl = "{base_url}/feeds/{size}.xml"\n'
+                f'max_entries = {size}\npoll_interval_minutes = 0\n')
+
+
+def run_scale(size: int, base_url: str, workdir: str, streaming: bool) -> dict:
+    """
+    Run main.main() once against the fake servers with fresh state files, and
+    read per-stage timings from the run's `stage` metrics spans. Every stage
+    main() runs is measured: feed polling, seen index, relevance filter,
+    extraction with checkpointing (or the streaming pipeline), report store,
+    product ideas and email delivery. The HTML cleaning, report rendering and
+    SMTP send spans are reported as well; they are part of the fetch and
+    notify stages, not added to them.
+    """
+    # Imported after config is pointed at the fake server and temporary files
+    import main
+    from metrics import metrics
+    from report_store import ReportStore
+
+    scale_dir = os.path.join(workdir, str(size))
+    os.makedirs(scale_dir)
+    _write_sources(os.path.join(scale_dir, "sources.toml"), base_url, size)
+    config.SOURCES_FILE = os.path.join(scale_dir, "sources.toml")
+    config.FEED_STATE_FILE = os.path.join(scale_dir, "feed_state.json")
+    config.SEEN_INDEX_FILE = os.path.join(scale_dir, "seen_articles.sqlite3")
+    config.CHECKPOINT_FILE = os.path.join(scale_dir, "run_checkpoint.jsonl")
+    config.REPORT_STORE_FILE = os.path.join(scale_dir, "reports.sqlite3")
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    main.main(use_cache=False, streaming=streaming)
+    total = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings = {}
+    latencies = []
+    for span in metrics.to_profile()['spans']:
+        if span['name'] in ('stage', 'html_clean', 'render', 'smtp_send'):
+            name = span['labels']['stage'] if span['name'] == 'stage' else span['name']
+            timings[name] = round(timings.get(name, 0.0) + span['seconds'], 4)
+        elif span['name'] == 'ollama_request':
+            latencies.append(span['seconds'])
+
+    store = ReportStore()
+    use_cases = sum(1 for _ in store.query_use_cases())
+    ideas = sum(1 for _ in store.query_product_ideas())
+    store.close()
+
+    return {
+        "feed_items": size,
+        "llm_requests": len(latencies),
+        "unique_use_cases": use_cases,
+        "product_ideas": ideas,
+        "stages": timings,
+        "total_seconds": round(total, 4),
+        "items_per_second": round(size / total, 2) if total else None,
+        "llm_latency_avg": round(sum(latencies) / len(latencies), 4) if latencies else 0.0,
+        "llm_latency_max": round(max(latencies), 4) if latencies else 0.0,
+        "peak_memory_bytes": peak,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Return human-readable regressions beyond `tolerance` (fractional slowdown)."""
+    regressions = []
+    for scale, run in results["runs"].items():
+        base = baseline.get("runs", {}).get(scale)
+        if not base:
+            continue
+        for stage, seconds in run["stages"].items():
+            before = base["stages"].get(stage)
+            # Ignore sub-10ms stages, they are dominated by noise
+            if before and seconds > 0.01 and seconds > before * (1 + tolerance):
+                regressions.append(f"{scale} articles / {stage}: {before:.3f}s -> {seconds:.3f}s")
+        if run["peak_memory_bytes"] > base["peak_memory_bytes"] * (1 + tolerance):
+            regressions.append(f"{scale} articles / peak memory: "
+                               f"{base['peak_memory_bytes']} -> {run['peak_memory_bytes']} bytes")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the AI News Agent pipeline")
+    parser.add_argument('--scales', type=int, nargs='+', default=DEFAULT_SCALES,
+                        help="Numbers of articles to benchmark")
+    parser.add_argument('--latency', type=float, default=0.05,
+                        help="Fake Ollama delay before the first token, in seconds")
+    parser.add_argument('--token-rate', type=float, default=500.0,
+                        help="Fake Ollama generation speed in tokens per second")
+    parser.add_argument('--workers', type=int, default=config.EXTRACTION_WORKERS,
+                        help="Extraction worker count")
+    parser.add_argument('--stream', action='store_true',
+                        help="Benchmark the streaming pipeline instead of the staged run")
+    parser.add_argument('--output', help="Write the JSON report to this file")
+    parser.add_argument('--compare', help="Baseline JSON report to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="Allowed fractional slowdown before --compare fails")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    http_server, smtp_server = start_servers(args.latency, args.token_rate, args.scales)
+    base_url = f"http://127.0.0.1:{http_server.server_address[1]}"
+
+    # Point the pipeline at the stand-ins and keep benchmark state out of the working tree.
+    # Settings main.py and notifier.py import by name must be set before they are imported.
+    workdir = tempfile.mkdtemp(prefix="news_agent_bench_")
+    config.OLLAMA_URL = config.OLLAMA_HOST = base_url
+    config.OLLAMA_HOSTS = []
+    config.EXTRACTION_WORKERS = args.workers
+    config.MAX_ARTICLES_PER_RUN = max(args.scales)
+    config.LLM_CACHE_FILE = os.path.join(workdir, "llm_cache.sqlite3")
+    config.ARTICLE_CACHE_DIR = os.path.join(workdir, "article_cache")
+    config.LOG_FILE = os.path.join(workdir, "news_agent.log")
+    config.METRICS_PROFILE_DIR = os.path.join(workdir, "profiles")
+    config.METRICS_TEXTFILE = os.path.join(workdir, "news_agent.prom")
+    config.REPORT_JSON_ENABLED = False
+    config.SMTP_HOST, config.SMTP_PORT = "127.0.0.1", smtp_server.server_address[1]
+    config.SMTP_STARTTLS = config.SMTP_LOGIN = False
+    config.EMAIL_ASYNC = False  # so the notify stage includes delivery, not just queueing
+    config.EMAIL_USER = "bench@example.com"
+    config.EMAIL_TO = "sink@example.com"
+
+    results = {
+        "python": sys.version.split()[0],
+        "settings": {"latency": args.latency, "token_rate": args.token_rate, "workers": args.workers,
+                     "stream": config.OLLAMA_STREAM, "batched": config.EXTRACTION_BATCH_ENABLED,
+                     "pipeline_streaming": args.stream},
+        "runs": {},
+    }
+    for size in args.scales:
+        results["runs"][str(size)] = run_scale(size, base_url, workdir, args.stream)
+
+    http_server.shutdown()
+    smtp_server.shutdown()
+
+    report = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(report)
+    print(report)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
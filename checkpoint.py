@@ -0,0 +1,111 @@
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+import config
+from seen_index import canonicalize_url
+
+logger = logging.getLogger(__name__)
+
+
+def article_key(article: Dict) -> str:
+    return canonicalize_url(article.get('url', '')) or article.get('title', '')
+
+
+class RunCheckpoint:
+    """
+    Per-article extraction checkpoint for resumable runs, stored as JSON lines.
+    The first line holds the run's article list (written atomically via a
+    temp file and rename); each finished article then appends one line that
+    is flushed and fsynced before the next result is recorded, so a crash
+    loses at most the LLM calls that were in flight. A torn last line from
+    a crash mid-write is ignored on load. Streaming runs start with an
+    empty list and append each article as it is admitted. The first line
+    also records when the run started, so a resumed run keeps its original
+    age and stale checkpoints can be discarded.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or config.CHECKPOINT_FILE
+        self._lock = threading.Lock()
+        self._file = None
+
+    def load(self, max_age: float = None) -> Optional[Dict]:
+        """
+        Return {'articles': [...], 'results': {key: use_cases}, 'started_at': epoch}
+        or None if there is nothing to resume. A checkpoint whose run started
+        more than `max_age` seconds ago is removed instead of resumed.
+        """
+        if not os.path.exists(self.path):
+            return None
+
+        articles = None
+        started_at = None
+        results = {}
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    logger.warning("Ignoring incomplete checkpoint line")
+                    continue
+                if record.get('type') == 'articles':
+                    articles = record['articles']
+                    started_at = record.get('started_at')
+                elif record.get('type') == 'article' and articles is not None:
+                    articles.append(record['article'])
+                elif record.get('type') == 'result':
+                    results[record['key']] = record['use_cases']
+
+        if not articles:
+            return None
+        if max_age is not None and (started_at is None or time.time() - started_at > max_age):
+            logger.info(f"Discarding checkpoint older than {max_age / 3600:.1f}h instead of resuming it")
+            self.clear()
+            return None
+        return {'articles': articles, 'results': results, 'started_at': started_at}
+
+    def start(self, articles: List[Dict], results: Dict[str, List] = None, started_at: float = None):
+        """Begin a checkpoint for this article list, carrying over a resumed run's results and start time."""
+        self.close()
+        header = {'type': 'articles', 'articles': articles, 'started_at': started_at or time.time()}
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(header, ensure_ascii=False) + "\n")
+            for key, use_cases in (results or {}).items():
+                f.write(json.dumps({'type': 'result', 'key': key, 'use_cases': use_cases}, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def add_article(self, article: Dict):
+        """Durably append an article admitted after start()."""
+        self._append(json.dumps({'type': 'article', 'article': article}, ensure_ascii=False) + "\n")
+
+    def record(self, article: Dict, use_cases: List[Dict]):
+        """Durably append one article's extraction result."""
+        self._append(json.dumps({'type': 'result', 'key': article_key(article), 'use_cases': use_cases},
+                                ensure_ascii=False) + "\n")
+
+    def _append(self, line: str):
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def clear(self):
+        """Remove the checkpoint once the run has completed."""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
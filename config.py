@@ -9,6 +9,22 @@ load_dotenv()
 EMAIL_USER = os.getenv("EMAIL_USER")
 EMAIL_PASS = os.getenv("EMAIL_PASS")
 EMAIL_TO = os.getenv("EMAIL_TO")
+# Point SMTP_HOST/PORT at a local debugging server (with STARTTLS and login off) to test without Gmail
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() != "false"
+SMTP_LOGIN = os.getenv("SMTP_LOGIN", "true").lower() != "false"  # Log in with EMAIL_USER/EMAIL_PASS
+SMTP_TIMEOUT = 30  # seconds
+SMTP_IDLE_TIMEOUT = 120  # Reconnect instead of reusing a connection idle this long (seconds)
+SMTP_BATCH_SIZE = 50  # Recipients per message; 1 sends each recipient a separate copy
+SMTP_MAX_RETRIES = 3
+SMTP_RETRY_BASE_DELAY = 2  # seconds; doubled per attempt with random jitter
+SMTP_RETRY_MAX_DELAY = 30  # seconds
+EMAIL_ASYNC = True  # Deliver from a background thread so the pipeline does not wait on the mail server
+EMAIL_FLUSH_TIMEOUT = 15  # seconds a run waits for queued email so delivery metrics are exported with it
+EMAIL_MAX_USE_CASES = 50  # Use cases listed in the email; the rest are summarized (0 = all)
+EMAIL_MAX_PRODUCT_IDEAS = 20  # Product ideas listed in the email (0 = all)
+EMAIL_FULL_REPORT_URL = os.getenv("EMAIL_FULL_REPORT_URL")  # Linked when the email is cut short
 
 # ================================
 # Logging
@@ -16,12 +32,43 @@ EMAIL_TO = os.getenv("EMAIL_TO")
 LOG_FILE = "news_agent.log"
 LOG_LEVEL = "INFO"
 
+# ================================
+# Report Storage
+# ================================
+REPORT_STORE_FILE = "reports.sqlite3"  # Append-only store of all use cases and ideas
+REPORT_JSON_ENABLED = False  # Also write the legacy daily_report_*.json file per run
+CHECKPOINT_FILE = "run_checkpoint.jsonl"  # Per-article extraction results of the current run
+CHECKPOINT_MAX_AGE = 6 * 3600  # seconds; older checkpoints are discarded instead of resumed (None = no limit)
+
+# ================================
+# Metrics
+# ================================
+METRICS_PROFILE_DIR = "profiles"  # Per-run JSON profiles (None to disable)
+METRICS_TEXTFILE = "news_agent.prom"  # Prometheus textfile collector output (None to disable)
+METRICS_PORT = None  # Serve /metrics on this port in scheduler daemon mode
+
 # ================================
 # Scraper
 # ================================
-MAX_ARTICLES_PER_SOURCE = 5
+SOURCES_FILE = "sources.toml"  # Feed registry: priority, poll interval, entry cap, enable flag
+MAX_ARTICLES_PER_SOURCE = 5  # Default entry cap for sources that do not set max_entries
+MAX_ARTICLES_PER_RUN = 12  # Articles sent to extraction per run, highest priority first
+DEFAULT_POLL_INTERVAL_MINUTES = 60  # For sources that do not set poll_interval_minutes
+POLL_INTERVAL_SLACK_SECONDS = 120  # Treat a source as due this much before its interval ends
 REQUEST_TIMEOUT = 10
-RATE_LIMIT_DELAY = 3
+FEED_FETCH_CONCURRENT = True  # Fetch feeds in parallel instead of one by one
+FEED_FETCH_WORKERS = 8  # Max feeds fetched at the same time
+FEED_HOST_MIN_INTERVAL = 1.0  # Seconds between two requests to the same host
+FEED_STATE_FILE = "feed_state.json"  # Stored ETag / Last-Modified per feed
+
+# ================================
+# Full Article Fetching
+# ================================
+FETCH_FULL_ARTICLES = False  # Download article pages instead of relying on RSS summaries
+ARTICLE_FETCH_WORKERS = 8  # Pages downloaded at the same time
+ARTICLE_MAX_TOKENS = 2000  # Article text is truncated to roughly this many tokens
+ARTICLE_CACHE_DIR = "article_cache"  # Extracted page text, keyed by URL hash
+ARTICLE_CACHE_TTL = 7 * 24 * 3600  # seconds
 
 # ================================
 # LLM Settings
@@ -29,14 +76,90 @@ RATE_LIMIT_DELAY = 3
 MAX_RETRIES = 3
 OLLAMA_URL = "http://localhost:11434"  # Base Ollama URL
 OLLAMA_HOST = OLLAMA_URL
+# Comma-separated Ollama servers to spread requests over; empty uses OLLAMA_HOST only
+OLLAMA_HOSTS = [url.strip() for url in os.getenv("OLLAMA_HOSTS", "").split(",") if url.strip()]
+OLLAMA_HEALTH_CHECK_INTERVAL = 30  # seconds between node health checks when several hosts are set
+OLLAMA_HEALTH_CHECK_TIMEOUT = 5  # seconds
 OLLAMA_MODEL = "gemma3:4b"
 OLLAMA_TIMEOUT = 300  # seconds
+OLLAMA_STREAM = True  # Stream responses and stop as soon as a complete JSON list arrives
+OLLAMA_STRUCTURED_OUTPUT = True  # Constrain output to a JSON schema via Ollama's "format" field
+OLLAMA_STREAM_TRAILING_CHUNKS = 4  # Chunks read past the JSON value to pick up Ollama's final token counts
+# How long Ollama keeps the model loaded after each request ("30m"; a negative duration keeps it forever)
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "4096")) or None  # Context window in tokens; 0 uses the model default
+# Output token caps per request type; prompts are trimmed so prompt + output fits OLLAMA_NUM_CTX
+EXTRACTION_NUM_PREDICT = 384  # Per article; a JSON list of a handful of use cases
+PRODUCT_IDEA_NUM_PREDICT = 1024
+PROMPT_TOKEN_MARGIN = 128  # Headroom for error in the local token estimate
+OLLAMA_WARMUP_ENABLED = True  # Load the model while feeds are being fetched
+OLLAMA_POOL_SIZE = 10  # Max keep-alive connections to the Ollama server
+OLLAMA_RETRY_BASE_DELAY = 2  # seconds; doubled per attempt with random jitter
+OLLAMA_RETRY_MAX_DELAY = 30  # seconds
+OLLAMA_BREAKER_THRESHOLD = 5  # Consecutive failures before calls are paused
+OLLAMA_BREAKER_COOLDOWN = 60  # seconds before a trial request is let through
+# Concurrent extraction requests; match the server's OLLAMA_NUM_PARALLEL
+EXTRACTION_WORKERS = int(os.getenv("OLLAMA_NUM_PARALLEL", "4"))
+# Model cascade: a small model takes the first pass so OLLAMA_MODEL only sees the articles that need it
+#   "off"      every article goes to OLLAMA_MODEL
+#   "validate" the small model extracts; output that fails validation is redone by OLLAMA_MODEL
+#   "triage"   the small model answers yes/no relevance; only flagged articles go to OLLAMA_MODEL
+CASCADE_POLICY = os.getenv("CASCADE_POLICY", "off")
+CASCADE_SMALL_MODEL = os.getenv("CASCADE_SMALL_MODEL", "gemma3:1b")
+CASCADE_MIN_USE_CASES = 1  # "validate": fewer use cases than this escalates
+CASCADE_MIN_USE_CASE_WORDS = 4  # "validate": any shorter use case escalates as too vague
+TRIAGE_NUM_PREDICT = 16  # The triage answer is a single boolean
+EXTRACTION_BATCH_ENABLED = False  # Pack several articles into one extraction prompt
+EXTRACTION_BATCH_MAX_ARTICLES = 6  # Upper bound on articles per batched request
+EXTRACTION_BATCH_TOKEN_BUDGET = 3000  # Estimated article tokens per batched request
+# Stream articles from fetching into extraction through bounded queues (per-article requests only)
+PIPELINE_STREAMING = False
+PIPELINE_QUEUE_SIZE = 8  # Articles buffered between stages before upstream stages wait
+
+# ================================
+# LLM Result Cache
+# ================================
+LLM_CACHE_ENABLED = True  # Reuse extraction results for unchanged articles
+LLM_CACHE_FILE = "llm_cache.sqlite3"
+LLM_CACHE_TTL = 7 * 24 * 3600  # seconds; 0 disables expiry
+LLM_CACHE_MAX_ENTRIES = 5000  # least recently used entries beyond this are evicted
 
 # ================================
 # Data Limits
 # ================================
 MIN_CONTENT_LENGTH = 50  # Minimum characters to analyze
 
+# ================================
+# Product Idea Generation
+# ================================
+PRODUCT_IDEA_HIERARCHICAL = True  # Map-reduce over clusters when use cases exceed the cluster size
+PRODUCT_IDEA_CLUSTER_SIZE = 25  # Max use cases per map prompt
+PRODUCT_IDEA_MAP_TOKEN_BUDGET = 1500  # Estimated use case tokens per map prompt
+PRODUCT_IDEA_REDUCE_BATCH = 40  # Max ideas per reduce prompt
+PRODUCT_IDEA_MAX_FINAL = 15  # Ideas requested from each reduce prompt
+
+# ================================
+# Seen-Article Index
+# ================================
+SEEN_INDEX_ENABLED = True  # Skip articles already processed on earlier runs
+SEEN_INDEX_FILE = "seen_articles.sqlite3"
+SEEN_INDEX_RETENTION_DAYS = 30  # Forget articles not seen in any feed for this long
+
+# ================================
+# Relevance Pre-Filter
+# ================================
+RELEVANCE_FILTER_ENABLED = True  # Score articles locally and skip off-topic ones before the LLM
+RELEVANCE_MIN_SCORE = 1.0  # Keyword score below which an article is not sent to Ollama
+RELEVANCE_TOP_K = 0  # Keep only the K best-scoring articles (0 = no limit)
+
+# ================================
+# Near-Duplicate Detection
+# ================================
+DEDUP_SIMILARITY_THRESHOLD = 0.8  # Jaccard similarity at or above which use cases count as duplicates
+DEDUP_SHINGLE_SIZE = 1  # Words per shingle; 1 tolerates reordered paraphrases
+DEDUP_NUM_PERM = 64  # MinHash permutations
+DEDUP_LSH_BANDS = 16  # LSH bands (num_perm / bands rows each)
+
 # ================================
 # AI PROMPTS
 # ================================
@@ -62,6 +185,38 @@ Instructions:
 Return ONLY the JSON list.
 """
 
+TRIAGE_PROMPT_TEMPLATE = """
+You are screening news for an enterprise software company (like Aurigo).
+
+Does the following article describe a specific, practical use of AI, automation, or digital transformation that large enterprises could adopt?
+
+Title: {title}
+
+Content:
+{content}
+
+Answer with a JSON object: {{"relevant": true}} or {{"relevant": false}}
+"""
+
+BATCH_USE_CASE_PROMPT_TEMPLATE = """
+You are an expert business analyst specializing in AI-driven enterprise transformation.
+
+Analyze each of the following articles and extract **specific, actionable use cases** related to AI, automation, or digital transformation that could benefit large enterprises (like Aurigo’s products).
+
+{articles_block}
+
+Instructions:
+- Each use case should describe a specific problem and a possible AI/tech-based solution.
+- Focus on **practical, implementable use cases**.
+- Avoid generic or vague statements.
+- Return only a JSON object that maps every article number to a JSON list of strings.
+- Use an empty list for an article with no use cases.
+- Example output:
+{{"1": ["AI-powered contract validation", "Automated invoice classification"], "2": ["Predictive maintenance using IoT data"]}}
+
+Return ONLY the JSON object.
+"""
+
 PRODUCT_IDEA_PROMPT_TEMPLATE = """
 You are a creative product manager at Aurigo, an enterprise software company.
 
@@ -80,3 +235,22 @@ Guidelines:
 Example:
 ["AI-driven project risk analyzer", "Automated compliance audit engine", "Intelligent document approval assistant"]
 """
+
+PRODUCT_IDEA_REDUCE_PROMPT_TEMPLATE = """
+You are a creative product manager at Aurigo, an enterprise software company.
+
+The following product ideas were generated from different groups of AI/tech use cases. Some overlap.
+
+Product Ideas:
+{ideas_str}
+
+Guidelines:
+- Merge ideas that describe the same product or feature into one.
+- Keep the most specific, practical, and enterprise-relevant ideas.
+- Return at most {max_ideas} ideas.
+- Do NOT include any explanation or preface.
+- Return ONLY a JSON array of concise product ideas.
+
+Example:
+["AI-driven project risk analyzer", "Automated compliance audit engine", "Intelligent document approval assistant"]
+"""
\ No newline at end of file
@@ -0,0 +1,107 @@
+import hashlib
+import logging
+import re
+from typing import Callable, Dict, List, Optional, Sequence
+import config
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "into", "is", "it",
+    "of", "on", "or", "that", "the", "their", "to", "using", "via", "with",
+}
+_MAX_HASH = (1 << 61) - 1  # Mersenne prime used for the universal hash family
+
+
+def shingles(text: str, size: int = None) -> set:
+    """Word n-gram shingles of normalized text without stopwords."""
+    size = size or config.DEDUP_SHINGLE_SIZE
+    words = [w for w in _WORD_RE.findall(text.lower()) if w not in _STOPWORDS]
+    if len(words) < size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class MinHashLSH:
+    """
+    MinHash signatures with banded locality-sensitive hashing.
+    Only items that collide in at least one band are compared, so finding
+    near-duplicates scales roughly linearly instead of all-pairs.
+    """
+
+    def __init__(self, num_perm: int = None, bands: int = None, seed: int = 1):
+        self.num_perm = num_perm or config.DEDUP_NUM_PERM
+        self.bands = bands or config.DEDUP_LSH_BANDS
+        if self.num_perm % self.bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.rows = self.num_perm // self.bands
+
+        # Deterministic (a, b) pairs for h(x) = (a * x + b) mod p
+        self._perms = []
+        for i in range(self.num_perm):
+            digest = hashlib.sha256(f"{seed}:{i}".encode()).digest()
+            a = int.from_bytes(digest[:8], 'big') % (_MAX_HASH - 1) + 1
+            b = int.from_bytes(digest[8:16], 'big') % _MAX_HASH
+            self._perms.append((a, b))
+
+        self._buckets: List[Dict[tuple, List[int]]] = [{} for _ in range(self.bands)]
+
+    def signature(self, items: set) -> List[int]:
+        hashed = [int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), 'big') for s in items]
+        if not hashed:
+            return [_MAX_HASH] * self.num_perm
+        return [min((a * x + b) % _MAX_HASH for x in hashed) for a, b in self._perms]
+
+    def query_and_insert(self, key: int, signature: List[int]) -> set:
+        """Return keys sharing a band with this signature, then index it."""
+        candidates = set()
+        for band in range(self.bands):
+            band_key = tuple(signature[band * self.rows:(band + 1) * self.rows])
+            bucket = self._buckets[band].setdefault(band_key, [])
+            candidates.update(bucket)
+            bucket.append(key)
+        return candidates
+
+
+def find_near_duplicates(texts: Sequence[str], threshold: float = None) -> List[Optional[int]]:
+    """
+    For each text, return the index of an earlier text it duplicates, or None.
+    Candidates come from MinHash LSH and are confirmed with exact Jaccard
+    similarity over shingles against `threshold`.
+    """
+    threshold = config.DEDUP_SIMILARITY_THRESHOLD if threshold is None else threshold
+    lsh = MinHashLSH()
+    shingle_sets = []
+    duplicate_of: List[Optional[int]] = []
+
+    for index, text in enumerate(texts):
+        items = shingles(text)
+        shingle_sets.append(items)
+
+        match = None
+        for candidate in sorted(lsh.query_and_insert(index, lsh.signature(items))):
+            if duplicate_of[candidate] is None and jaccard(items, shingle_sets[candidate]) >= threshold:
+                match = candidate
+                break
+        duplicate_of.append(match)
+
+    return duplicate_of
+
+
+def remove_near_duplicates(records: List[Dict], key: Callable[[Dict], str] = None,
+                           threshold: float = None, kind: str = "near") -> List[Dict]:
+    """Keep the first record of every group of near-duplicate texts."""
+    key = key or (lambda record: record.get('use_case', ''))
+    duplicate_of = find_near_duplicates([key(record) for record in records], threshold)
+    unique = [record for record, dup in zip(records, duplicate_of) if dup is None]
+    logger.info(f"Removed {len(records) - len(unique)} near-duplicates")
+    metrics.inc("duplicates_removed_total", len(records) - len(unique), kind=kind)
+    return unique
@@ -0,0 +1,99 @@
+import sqlite3
+import hashlib
+import json
+import logging
+import threading
+import time
+from typing import List, Optional
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class LLMCache:
+    """
+    Persistent content-addressed cache for LLM results, stored in SQLite.
+    Entries expire after a TTL and the least recently used ones are evicted
+    once the cache grows past its size limit.
+    """
+
+    def __init__(self, path: str = None, ttl: int = None, max_entries: int = None):
+        self.path = path or config.LLM_CACHE_FILE
+        self.ttl = ttl if ttl is not None else config.LLM_CACHE_TTL
+        self.max_entries = max_entries if max_entries is not None else config.LLM_CACHE_MAX_ENTRIES
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # One connection shared across threads, guarded by the lock above
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache(accessed_at)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model: str, prompt_template: str, temperature: float, title: str, content: str) -> str:
+        """Hash everything that influences the model output into a cache key."""
+        material = json.dumps([model, prompt_template, temperature, title, content], ensure_ascii=False)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[List]:
+        """Return the cached value, or None on a miss or expired entry."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None or (self.ttl and now - row[1] > self.ttl):
+                self.misses += 1
+                return None
+
+            self._conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+
+        return json.loads(row[0])
+
+    def set(self, key: str, value: List):
+        """Store a value and evict expired or excess entries."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now, now)
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float):
+        """Drop expired entries, then the least recently used ones above max_entries."""
+        if self.ttl:
+            self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl,))
+
+        if self.max_entries:
+            self._conn.execute(
+                """
+                DELETE FROM llm_cache WHERE key IN (
+                    SELECT key FROM llm_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,)
+            )
+
+    def stats(self) -> str:
+        total = self.hits + self.misses
+        hit_rate = (self.hits / total * 100) if total else 0.0
+        return f"{self.hits} hits, {self.misses} misses ({hit_rate:.0f}% hit rate)"
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,209 @@
+import json
+import logging
+from typing import Any, Dict, List, Optional
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class JsonStreamScanner:
+    """
+    Incrementally scan streamed model output for the first complete JSON
+    value of the expected type (list or dict).
+    Text is fed chunk by chunk; feed() returns True as soon as a balanced
+    `[...]` (or `{...}`) that parses as the expected type has been seen, so
+    the caller can stop generation instead of waiting for the model to
+    finish talking.
+    """
+
+    BRACKETS = {list: ('[', ']'), dict: ('{', '}')}
+
+    def __init__(self, expect: type = list):
+        self.expect = expect
+        self._open, self._close = self.BRACKETS[expect]
+        self.result = None
+        self.json_text = ""
+        self._text = ""
+        self._pos = 0
+        self._start = None
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, chunk: str) -> bool:
+        if self.result is not None:
+            return True
+
+        self._text += chunk
+        text = self._text
+
+        while self._pos < len(text):
+            char = text[self._pos]
+
+            if self._start is None:
+                if char == self._open:
+                    self._start = self._pos
+                    self._depth = 1
+            elif self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in '[{':
+                self._depth += 1
+            elif char in ']}':
+                self._depth -= 1
+                if self._depth == 0:
+                    candidate = text[self._start:self._pos + 1]
+                    if self._accept(candidate):
+                        return True
+                    # Not valid JSON (e.g. a bracket in prose); look for the next candidate
+                    self._pos = self._start
+                    self._start = None
+
+            self._pos += 1
+
+        return False
+
+    def _accept(self, candidate: str) -> bool:
+        try:
+            parsed = json.loads(candidate)
+        except ValueError:
+            return False
+        if not isinstance(parsed, self.expect):
+            return False
+        self.result = parsed
+        self.json_text = candidate
+        return True
+
+    @property
+    def text(self) -> str:
+        return self._text
+
+
+def find_json(text: str, expect: type = list):
+    """Return the first JSON value of the expected type embedded in text, or None."""
+    scanner = JsonStreamScanner(expect)
+    scanner.feed(text or "")
+    return scanner.result
+
+
+# Ollama "format" schemas for structured output
+STRING_LIST_SCHEMA = {"type": "array", "items": {"type": "string"}}
+
+
+def keyed_lists_schema(count: int) -> Dict:
+    """Schema for an object mapping "1".."count" to lists of strings (batched extraction)."""
+    keys = [str(number) for number in range(1, count + 1)]
+    return {
+        "type": "object",
+        "properties": {key: STRING_LIST_SCHEMA for key in keys},
+        "required": keys,
+    }
+
+
+_decoder = json.JSONDecoder()
+
+
+def recover_partial_list(text: str) -> Optional[List]:
+    """
+    Salvage the complete elements of a JSON array that was cut off or has a
+    broken tail, e.g. '["a", "b", "c' -> ["a", "b"]. Stray commas between
+    elements are skipped. Returns None if no element could be recovered.
+    """
+    start = text.find('[')
+    if start < 0:
+        return None
+
+    items = []
+    pos = start + 1
+    length = len(text)
+    while pos < length:
+        char = text[pos]
+        if char in ' \t\r\n,':
+            pos += 1
+            continue
+        if char == ']':
+            break
+        try:
+            item, pos = _decoder.raw_decode(text, pos)
+        except ValueError:
+            break
+        items.append(item)
+    return items or None
+
+
+def parse_json(text: str, expect: type = list, kind: str = "response") -> Optional[Any]:
+    """
+    Tolerant parse of model output into a JSON value of type `expect`.
+    Tries, in order: the whole text (structured output is pure JSON, so this
+    is the common case and needs no scanning), the first complete value
+    embedded in prose or code fences, and for lists the complete elements of
+    a truncated array. Outcomes are counted in llm_json_responses_total.
+    """
+    text = (text or "").strip()
+    if not text:
+        metrics.inc("llm_json_responses_total", kind=kind, outcome="empty")
+        logger.error("Ollama response content is empty.")
+        return None
+
+    try:
+        parsed = json.loads(text)
+        if isinstance(parsed, expect):
+            metrics.inc("llm_json_responses_total", kind=kind, outcome="ok")
+            return parsed
+    except ValueError:
+        pass
+
+    parsed = find_json(text, expect)
+    if parsed is not None:
+        metrics.inc("llm_json_responses_total", kind=kind, outcome="embedded")
+        return parsed
+
+    if expect is list:
+        parsed = recover_partial_list(text)
+        if parsed is not None:
+            metrics.inc("llm_json_responses_total", kind=kind, outcome="repaired")
+            logger.warning(f"Recovered {len(parsed)} items from malformed JSON output")
+            return parsed
+
+    metrics.inc("llm_json_responses_total", kind=kind, outcome="failed")
+    logger.error(f"No JSON {expect.__name__} found in model output: {text[:500]}")
+    return None
+
+
+def clean_string_list(items: List, kind: str = "response") -> List[str]:
+    """
+    Keep the non-empty strings of a parsed list. Objects holding a single
+    string (e.g. {"use_case": "..."}) are unwrapped rather than thrown away;
+    anything else is dropped and counted.
+    """
+    strings = []
+    repaired = dropped = 0
+    for item in items:
+        if isinstance(item, dict):
+            values = [value for value in item.values() if isinstance(value, str)]
+            if len(values) == 1:
+                item = values[0]
+                repaired += 1
+        if isinstance(item, str) and item.strip():
+            strings.append(item.strip())
+        else:
+            dropped += 1
+
+    if repaired:
+        metrics.inc("llm_json_items_repaired_total", repaired, kind=kind)
+    if dropped:
+        metrics.inc("llm_json_items_dropped_total", dropped, kind=kind)
+        logger.warning(f"Dropped {dropped} invalid items from model output")
+    return strings
+
+
+def parse_string_list(text: str, kind: str = "response") -> List[str]:
+    """Parse model output expected to be a JSON list of strings; [] if nothing is usable."""
+    parsed = parse_json(text, list, kind)
+    return clean_string_list(parsed, kind) if parsed else []
@@ -0,0 +1,156 @@
+import logging
+import random
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import List
+import config
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class SMTPMailer:
+    """
+    Email delivery over one reusable SMTP connection.
+    Messages are sent from a single background thread, so a slow or
+    unreachable mail server never holds up the pipeline. The connection
+    stays open between messages and is re-established when it has idled
+    past SMTP_IDLE_TIMEOUT or the server dropped it. Recipients are split
+    into segments of SMTP_BATCH_SIZE (1 gives everyone their own copy) and
+    each segment is retried with jittered exponential backoff on its own.
+    """
+
+    def __init__(self, host: str = None, port: int = None):
+        self.host = host or config.SMTP_HOST
+        self.port = port or config.SMTP_PORT
+        self._conn = None
+        self._last_used = 0.0
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+        # One worker keeps sends ordered and the connection single-threaded;
+        # queued messages are still delivered before the interpreter exits
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="smtp")
+
+    def _connect(self) -> smtplib.SMTP:
+        with metrics.span("smtp_connect"):
+            conn = smtplib.SMTP(self.host, self.port, timeout=config.SMTP_TIMEOUT)
+            if config.SMTP_STARTTLS:
+                conn.starttls()
+            if config.SMTP_LOGIN:
+                conn.login(config.EMAIL_USER, config.EMAIL_PASS)
+        metrics.inc("smtp_connections_total")
+        return conn
+
+    def _connection(self) -> smtplib.SMTP:
+        if self._conn is not None and time.monotonic() - self._last_used > config.SMTP_IDLE_TIMEOUT:
+            self._disconnect()
+        if self._conn is None:
+            self._conn = self._connect()
+        return self._conn
+
+    def _disconnect(self):
+        if self._conn is None:
+            return
+        try:
+            self._conn.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+        self._conn = None
+
+    @staticmethod
+    def _build(subject: str, plain_text: str, html_text: str, recipients: List[str]) -> MIMEMultipart:
+        msg = MIMEMultipart('alternative')
+        msg['Subject'] = subject
+        msg['From'] = config.EMAIL_USER
+        msg['To'] = ', '.join(recipients)
+        msg.attach(MIMEText(plain_text, 'plain'))
+        msg.attach(MIMEText(html_text, 'html'))
+        return msg
+
+    def _send_segment(self, msg: MIMEMultipart, recipients: List[str], kind: str) -> bool:
+        for attempt in range(config.SMTP_MAX_RETRIES):
+            try:
+                with metrics.span("smtp_send", kind=kind):
+                    self._connection().send_message(msg, to_addrs=recipients)
+                self._last_used = time.monotonic()
+                metrics.inc("emails_sent_total", kind=kind)
+                return True
+            except smtplib.SMTPRecipientsRefused as e:
+                # Permanent: retrying will not make the addresses valid
+                logger.error(f"SMTP server refused recipients {sorted(e.recipients)}")
+                metrics.inc("smtp_errors_total", kind=kind, error=type(e).__name__)
+                return False
+            except (smtplib.SMTPException, OSError) as e:
+                # The connection may be unusable now, so start the next attempt on a fresh one
+                self._disconnect()
+                metrics.inc("smtp_errors_total", kind=kind, error=type(e).__name__)
+                logger.warning(f"SMTP error on attempt {attempt + 1}: {e}")
+
+            if attempt < config.SMTP_MAX_RETRIES - 1:
+                metrics.inc("smtp_retries_total", kind=kind)
+                ceiling = min(config.SMTP_RETRY_MAX_DELAY, config.SMTP_RETRY_BASE_DELAY * (2 ** attempt))
+                time.sleep(random.uniform(0, ceiling))
+
+        logger.error(f"Giving up on {kind} email to {len(recipients)} recipients")
+        return False
+
+    def _deliver(self, subject: str, plain_text: str, html_text: str, recipients: List[str], kind: str) -> bool:
+        size = max(1, config.SMTP_BATCH_SIZE)
+        delivered = 0
+        for start in range(0, len(recipients), size):
+            segment = recipients[start:start + size]
+            if self._send_segment(self._build(subject, plain_text, html_text, segment), segment, kind):
+                delivered += len(segment)
+        if delivered < len(recipients):
+            logger.error(f"{kind.capitalize()} email reached only {delivered}/{len(recipients)} recipients")
+            return False
+        logger.info(f"✅ {kind.capitalize()} email delivered to {delivered} recipients")
+        return True
+
+    def send(self, subject: str, plain_text: str, html_text: str, recipients: List[str], kind: str = "report",
+             block: bool = None) -> bool:
+        """
+        Queue a message for delivery. Returns True once queued, or, when
+        blocking (the default if EMAIL_ASYNC is off), whether every recipient
+        received it.
+        """
+        future = self._executor.submit(self._deliver, subject, plain_text, html_text, recipients, kind)
+        with self._pending_lock:
+            self._pending.add(future)
+        future.add_done_callback(self._done)
+
+        if block is None:
+            block = not config.EMAIL_ASYNC
+        return future.result() if block else True
+
+    def _done(self, future):
+        with self._pending_lock:
+            self._pending.discard(future)
+
+    def flush(self, timeout: float = None) -> bool:
+        """Wait for queued messages; returns False if some are still pending after `timeout`."""
+        with self._pending_lock:
+            pending = list(self._pending)
+        _, not_done = wait(pending, timeout=timeout)
+        return not not_done
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self._disconnect()
+
+
+_shared_mailer = None
+_shared_lock = threading.Lock()
+
+
+def get_mailer() -> SMTPMailer:
+    """Return the process-wide mailer so every notification reuses one connection."""
+    global _shared_mailer
+    with _shared_lock:
+        if _shared_mailer is None:
+            _shared_mailer = SMTPMailer()
+        return _shared_mailer
@@ -1,8 +1,12 @@
 import logging
 import json
 import sys
+import argparse
+import os
+import time
+import threading
 from datetime import datetime
-from time import sleep
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import urllib3
 
 # Suppress SSL warnings
@@ -12,28 +16,52 @@ urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 if sys.platform == 'win32':
     sys.stdout.reconfigure(encoding='utf-8')
 
-from scraper import get_tech_news, get_article_content
+from scraper import FeedPoller, get_tech_news, fetch_full_articles
 # Import the OllamaProcessor class instead of the function
-from ollama_processor import OllamaProcessor
+from ollama_processor import CASCADE_POLICIES, OllamaProcessor
 # Import the product generator function (now uses /api/chat)
 from ollama_product_generator import generate_product_ideas
+from dedup import remove_near_duplicates
+from seen_index import SeenArticleIndex
+from relevance import filter_relevant
+from pipeline import StreamingPipeline
+from metrics import metrics
+from report_store import ReportStore
+from checkpoint import RunCheckpoint, article_key
 from notifier import send_email_notification, send_error_notification
-from config import LOG_FILE, LOG_LEVEL, RATE_LIMIT_DELAY
-
-# Setup logging
-logging.basicConfig(
-    level=getattr(logging, LOG_LEVEL),
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(LOG_FILE, encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
+from mailer import get_mailer
+from config import (LOG_FILE, LOG_LEVEL, EXTRACTION_WORKERS, EXTRACTION_BATCH_ENABLED, SEEN_INDEX_ENABLED,
+                    METRICS_PROFILE_DIR, METRICS_TEXTFILE, REPORT_JSON_ENABLED,
+                    FETCH_FULL_ARTICLES, MAX_ARTICLES_PER_RUN, RELEVANCE_FILTER_ENABLED,
+                    PIPELINE_STREAMING, OLLAMA_WARMUP_ENABLED, EMAIL_ASYNC, EMAIL_FLUSH_TIMEOUT,
+                    CHECKPOINT_MAX_AGE)
+
 logger = logging.getLogger(__name__)
 
 
+def setup_logging():
+    """
+    Log to LOG_FILE and the console. Works even when the caller (such as the
+    scheduler daemon) already configured logging, where basicConfig would do
+    nothing, and adds each handler only once.
+    """
+    root = logging.getLogger()
+    root.setLevel(getattr(logging, LOG_LEVEL))
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    log_path = os.path.abspath(LOG_FILE)
+    if not any(isinstance(h, logging.FileHandler) and h.baseFilename == log_path for h in root.handlers):
+        file_handler = logging.FileHandler(LOG_FILE, encoding='utf-8')
+        file_handler.setFormatter(formatter)
+        root.addHandler(file_handler)
+    if not any(type(h) is logging.StreamHandler for h in root.handlers):
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(formatter)
+        root.addHandler(console_handler)
+
+
 def remove_duplicates(use_cases):
-    """Remove duplicate use cases"""
+    """Remove exact duplicates, then paraphrased near-duplicates"""
     seen = set()
     unique = []
     
@@ -47,7 +75,172 @@ def remove_duplicates(use_cases):
             unique.append(uc)
     
     logger.info(f"Removed {len(use_cases) - len(unique)} duplicates")
-    return unique
+    metrics.inc("duplicates_removed_total", len(use_cases) - len(unique), kind="exact")
+    return remove_near_duplicates(unique)
+
+
+def _article_content(article):
+    """Return the text to analyze, or None if the article has no substance"""
+    # Full text when FETCH_FULL_ARTICLES is on, otherwise the RSS summary
+    content = article.get('content') or article.get('summary')
+    if not content or len(content) <= 50:  # Only process if summary has substance
+        logger.warning(f"Could not retrieve content for: {article['title'][:80]}")
+        return None
+    return content
+
+
+def _tag_use_cases(article, use_cases):
+    """Wrap use case strings into dicts carrying their source article"""
+    if not use_cases:
+        logger.info(f"No use cases found in: {article['title'][:80]}")
+        return []
+
+    logger.info(f"Found {len(use_cases)} use cases in: {article['title'][:80]}")
+    return [
+        {
+            'product': 'General', # Placeholder if product isn't extracted separately
+            'use_case': uc_str,
+            'source_article': article['title'],
+            'source_url': article['url'],
+            'source_name': article['source']
+        }
+        for uc_str in use_cases
+    ]
+
+
+def process_article(ollama_proc, article, index=0, total=1):
+    """Extract use cases from a single article and tag them with their source; None if the LLM call failed"""
+    logger.info(f"Processing {index+1}/{total} [{article['source']}] {article['title']}")
+    
+    content = _article_content(article)
+    if content is None:
+        return []
+
+    use_cases = ollama_proc.extract_use_cases(content, article['title'])
+    if use_cases is None:
+        logger.error(f"Extraction failed for: {article['title'][:80]}")
+        return None
+    return _tag_use_cases(article, use_cases)
+
+
+def process_batch(ollama_proc, batch_articles):
+    """Extract use cases for several articles with one batched LLM request"""
+    logger.info(f"Processing batch of {len(batch_articles)} articles")
+    
+    results = [[] for _ in batch_articles]
+    positions = []
+    items = []
+    for position, article in enumerate(batch_articles):
+        content = _article_content(article)
+        if content is not None:
+            positions.append(position)
+            items.append({'title': article['title'], 'content': content})
+
+    for position, use_cases in zip(positions, ollama_proc.extract_use_cases_batch(items)):
+        if use_cases is None:
+            logger.error(f"Extraction failed for: {batch_articles[position]['title'][:80]}")
+            results[position] = None
+        else:
+            results[position] = _tag_use_cases(batch_articles[position], use_cases)
+    return results
+
+
+def extract_all_use_cases(ollama_proc, articles, workers=None, batched=None, on_result=None):
+    """
+    Run extraction over all articles with a bounded worker pool.
+    Each unit of work is one article, or a batch of articles planned by
+    OllamaProcessor.plan_batches when batching is enabled.
+    At most 2 * workers units are in flight at once, and results are
+    returned in article order regardless of completion order.
+    Returns (use_cases, latencies) where latencies holds seconds per article;
+    articles in the same batch share the batch latency.
+    `on_result(article, use_cases)` is called from the calling thread as soon
+    as each article finishes, e.g. to checkpoint it; use_cases is None when
+    the article's extraction failed.
+    """
+    workers = max(1, workers or EXTRACTION_WORKERS)
+    if batched is None:
+        batched = EXTRACTION_BATCH_ENABLED
+    max_in_flight = workers * 2
+    total = len(articles)
+    results = [[] for _ in range(total)]
+    latencies = [0.0] * total
+
+    if batched:
+        units = ollama_proc.plan_batches(articles)
+    else:
+        units = [[index] for index in range(total)]
+
+    def timed(unit):
+        started = time.perf_counter()
+        try:
+            if len(unit) == 1:
+                return [process_article(ollama_proc, articles[unit[0]], unit[0], total)]
+            return process_batch(ollama_proc, [articles[index] for index in unit])
+        except Exception as e:
+            logger.error(f"Error processing articles {[i + 1 for i in unit]}: {e}")
+            return [None for _ in unit]
+        finally:
+            elapsed = time.perf_counter() - started
+            for index in unit:
+                latencies[index] = elapsed
+
+    def collect(unit, unit_results):
+        for index, article_use_cases in zip(unit, unit_results):
+            results[index] = article_use_cases
+            if on_result:
+                on_result(articles[index], article_use_cases)
+
+    logger.info(f"Extracting use cases from {total} articles in {len(units)} requests with {workers} workers")
+    
+    pending = {}
+
+    def collect_finished(block):
+        # Results are collected in completion order; `results` restores article order
+        done, _ = wait(pending, timeout=None if block else 0, return_when=FIRST_COMPLETED)
+        for future in done:
+            collect(pending.pop(future), future.result())
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for unit in units:
+            # Backpressure: wait for a slot before submitting more work
+            while len(pending) >= max_in_flight:
+                collect_finished(block=True)
+            pending[executor.submit(timed, unit)] = unit
+            collect_finished(block=False)
+
+        while pending:
+            collect_finished(block=True)
+
+    for article, latency in zip(articles, latencies):
+        logger.info(f"{latency:6.2f}s  {article['title'][:80]}")
+
+    all_use_cases = [uc for article_use_cases in results for uc in article_use_cases or []]
+    return all_use_cases, latencies
+
+
+def export_metrics():
+    """Write the run's spans and counters as a JSON profile and Prometheus textfile"""
+    try:
+        if METRICS_PROFILE_DIR:
+            metrics.write_profile(
+                os.path.join(METRICS_PROFILE_DIR, f"run_profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+            )
+        if METRICS_TEXTFILE:
+            metrics.write_prometheus_textfile(METRICS_TEXTFILE)
+    except OSError as e:
+        logger.error(f"Error exporting metrics: {e}")
+
+
+def append_to_store(report_store, run_id, use_cases=None, product_ideas=None):
+    """Append results to the report store without failing the run"""
+    try:
+        if use_cases:
+            report_store.add_use_cases(run_id, use_cases)
+        if product_ideas:
+            report_store.add_product_ideas(run_id, product_ideas)
+    except Exception as e:
+        logger.error(f"Error writing to report store: {e}")
 
 
 def save_results(use_cases, product_ideas):
@@ -74,80 +267,161 @@ def save_results(use_cases, product_ideas):
         return None
 
 
-def main():
-    """Main execution function"""
+def main(use_cache=None, skip_seen=None, ollama_proc=None, resume=False, full_text=None, relevance_filter=None,
+         streaming=None, cascade_policy=None, resume_max_age=None):
+    """
+    Main execution function.
+    Long-running callers (scheduler daemon mode) can pass their own
+    OllamaProcessor so its cache and HTTP session survive between runs.
+    With resume=True, an interrupted run's checkpoint is picked up and only
+    the articles it had not finished are sent to the LLM, unless the run
+    started more than `resume_max_age` seconds ago (default CHECKPOINT_MAX_AGE).
+    With streaming=True, extraction starts as soon as the first feed is
+    parsed instead of after every feed has been fetched.
+    `cascade_policy` overrides config.CASCADE_POLICY for a new processor.
+    """
     logger.info("="*60)
     logger.info("Starting AI News Agent with Product Idea Generation")
     logger.info("Using Ollama (Local AI)")
     logger.info("="*60)
     
     start_time = datetime.now()
+    metrics.reset()
+    checkpoint = None
     
     try:
         # Create an instance of the OllamaProcessor
-        ollama_proc = OllamaProcessor()
+        if ollama_proc is None:
+            ollama_proc = OllamaProcessor(use_cache=use_cache, cascade_policy=cascade_policy)
+        
+        # Load the model while feeds are fetched so the first extraction does not pay for it
+        if OLLAMA_WARMUP_ENABLED:
+            threading.Thread(target=ollama_proc.client.keep_warm, args=(ollama_proc.model_name,),
+                             name="ollama-warmup", daemon=True).start()
+            if ollama_proc.cascade_policy != "off":
+                threading.Thread(target=ollama_proc.client.keep_warm, args=(ollama_proc.small_model,),
+                                 name="ollama-warmup-small", daemon=True).start()
 
-        # Step 1: Get latest tech news
-        logger.info("Fetching latest AI news...")
-        articles = get_tech_news()
+        # Results are appended to the report store as each stage produces them
+        report_store = ReportStore()
+        run_id = report_store.start_run(start_time)
+
+        # Skip articles handled on earlier runs and cross-posted duplicates
+        if skip_seen is None:
+            skip_seen = SEEN_INDEX_ENABLED
+        seen_index = SeenArticleIndex() if skip_seen else None
+        skipped_seen = skipped_duplicates = skipped_irrelevant = 0
+        
+        checkpoint = RunCheckpoint()
+        if resume_max_age is None:
+            resume_max_age = CHECKPOINT_MAX_AGE
+        resumed = checkpoint.load(resume_max_age) if resume else None
+        
+        if relevance_filter is None:
+            relevance_filter = RELEVANCE_FILTER_ENABLED
+        if full_text is None:
+            full_text = FETCH_FULL_ARTICLES
+        if streaming is None:
+            streaming = PIPELINE_STREAMING
+        
+        results_by_key = {}
+        # Feed validators are saved only once extraction is recorded; feeds listed
+        # in held_feeds keep their old ones so their unfinished articles are refetched
+        poller = None
+        held_feeds = set()
         
-        # Limit to first 12 articles
-        if len(articles) > 12:
-            logger.info(f"Limiting from {len(articles)} to 12 articles")
-            articles = articles[:12]
+        def on_result(article, article_use_cases):
+            # Failed extractions stay out of the checkpoint and seen index, and hold
+            # their feed's validators, so they are retried
+            if article_use_cases is None:
+                return
+            results_by_key[article_key(article)] = article_use_cases
+            checkpoint.record(article, article_use_cases)
+        
+        if resumed:
+            # Reuse the interrupted run's articles; feeds may now answer 304
+            articles = resumed['articles']
+            done_results = resumed['results']
+            logger.info(f"Resuming interrupted run: {len(done_results)}/{len(articles)} articles already extracted")
+        elif streaming:
+            # Steps 1-2 overlapped: each feed's articles flow into extraction as soon as it is parsed
+            logger.info("Streaming latest AI news into extraction...")
+            if seen_index:
+                seen_index.prune()
+            checkpoint.start([])
+            pipeline = StreamingPipeline(
+                lambda article: process_article(ollama_proc, article),
+                seen_index=seen_index, relevance_filter=relevance_filter, full_text=full_text,
+                on_article=checkpoint.add_article, on_result=on_result
+            )
+            with metrics.span("stage", stage="pipeline"):
+                articles, latencies, skipped = pipeline.run()
+            poller, held_feeds = pipeline.poller, pipeline.held_feeds
+            skipped_seen, skipped_duplicates = skipped['seen'], skipped['duplicates']
+            skipped_irrelevant = skipped['irrelevant']
+            done_results = None
+        else:
+            # Step 1: Get latest tech news
+            logger.info("Fetching latest AI news...")
+            poller = FeedPoller()
+            with metrics.span("stage", stage="fetch"):
+                articles = get_tech_news(poller=poller)
+            
+            if seen_index:
+                with metrics.span("stage", stage="seen"):
+                    seen_index.prune()
+                    articles, skipped_seen, skipped_duplicates = seen_index.filter_new(articles)
+                logger.info(f"Skipped {skipped_seen} already processed and {skipped_duplicates} duplicate articles")
+            
+            # Score relevance locally so off-topic items never reach Ollama
+            if relevance_filter and articles:
+                with metrics.span("stage", stage="relevance"):
+                    articles, skipped_irrelevant = filter_relevant(articles)
+            
+            # Limit to the highest priority articles
+            if len(articles) > MAX_ARTICLES_PER_RUN:
+                logger.info(f"Limiting from {len(articles)} to {MAX_ARTICLES_PER_RUN} articles")
+                held_feeds.update(a['feed_url'] for a in articles[MAX_ARTICLES_PER_RUN:])
+                articles = articles[:MAX_ARTICLES_PER_RUN]
+            
+            if full_text and articles:
+                with metrics.span("stage", stage="fetch_articles"):
+                    fetch_full_articles(articles)
+            done_results = {}
         
         if not articles:
+            if poller:
+                poller.save(held_feeds)
             logger.warning("No articles found. Exiting.")
             return
         
         logger.info(f"Found {len(articles)} relevant articles")
         
-        all_use_cases = []
+        if done_results is not None:
+            # Step 2: Extract use cases with a bounded pool of Ollama workers,
+            # checkpointing every finished article
+            checkpoint.start(articles, done_results, resumed['started_at'] if resumed else None)
+            results_by_key.update(done_results)
+            pending = [a for a in articles if article_key(a) not in done_results]
+            with metrics.span("stage", stage="extract"):
+                _, latencies = extract_all_use_cases(ollama_proc, pending, on_result=on_result)
+        all_use_cases = [uc for a in articles for uc in results_by_key.get(article_key(a), [])]
         
-        # Step 2: Process each article
-        for i, article in enumerate(articles):
-            logger.info(f"\n{'='*60}")
-            logger.info(f"Processing {i+1}/{len(articles)}")
-            logger.info(f"Source: {article['source']}")
-            logger.info(f"Title: {article['title']}")
-            logger.info(f"{'='*60}")
-            
-            # Use RSS summary (since full article fetch is blocked by firewall)
-            content = article.get('content') or article.get('summary')
-
-            if content and len(content) > 50:  # Only process if summary has substance
-                logger.info(f"Using RSS summary ({len(content)} chars)")
-                # Call the method on the instance
-                use_cases = ollama_proc.extract_use_cases(content, article['title']) # Note: swapped content and title order
-            
-                if use_cases:
-                    # Assuming use_cases from the class method are strings
-                    # If they are strings, wrap them or convert them to the expected dict format
-                    # For now, let's assume they are strings and convert them
-                    processed_use_cases = []
-                    for uc_str in use_cases:
-                        processed_use_cases.append({
-                            'product': 'General', # Placeholder if product isn't extracted separately
-                            'use_case': uc_str,
-                            'source_article': article['title'],
-                            'source_url': article['url'],
-                            'source_name': article['source']
-                        })
-                    
-                    all_use_cases.extend(processed_use_cases)
-                    logger.info(f"Found {len(use_cases)} use cases")
-                else:
-                    logger.info("No use cases found in this article")
-            else:
-                logger.warning(f"Could not retrieve content")
-            
-            if i < len(articles) - 1:
-                sleep(RATE_LIMIT_DELAY)
+        if seen_index:
+            # Every article whose extraction completed is handled, with or without use cases
+            seen_index.mark_processed([a for a in articles if article_key(a) in results_by_key])
+        
+        if poller:
+            held_feeds.update(a['feed_url'] for a in articles
+                              if article_key(a) not in results_by_key)
+            poller.save(held_feeds)
         
         # Step 3: Remove duplicates
         logger.info(f"\n{'='*60}")
         logger.info("Processing results...")
-        unique_use_cases = remove_duplicates(all_use_cases)
+        with metrics.span("stage", stage="dedup"):
+            unique_use_cases = remove_duplicates(all_use_cases)
+        append_to_store(report_store, run_id, use_cases=unique_use_cases)
         
         # Step 4: Generate Product Ideas
         product_ideas = []
@@ -156,33 +430,41 @@ def main():
             logger.info("Generating product ideas from use cases...")
             # Pass the list of use case strings to the product generator
             use_case_strings = [uc['use_case'] for uc in unique_use_cases]
-            product_ideas = generate_product_ideas(use_case_strings) # Pass list of strings
+            with metrics.span("stage", stage="product_ideas"):
+                product_ideas = generate_product_ideas(use_case_strings) # Pass list of strings
             
             if product_ideas:
+                append_to_store(report_store, run_id, product_ideas=product_ideas)
                 logger.info(f"Generated {len(product_ideas)} product ideas!")
             else:
                 logger.warning("No product ideas generated")
         
-        # Step 5: Save to file
-        save_results(unique_use_cases, product_ideas)
+        # Step 5: Legacy per-run JSON report (results are already in the report store)
+        if REPORT_JSON_ENABLED:
+            with metrics.span("stage", stage="save"):
+                save_results(unique_use_cases, product_ideas)
         
         # Step 6: Send notification
         logger.info(f"\n{'='*60}")
         logger.info("Sending email notification...")
         
         if unique_use_cases or product_ideas:
-            success = send_email_notification(unique_use_cases, product_ideas)
+            with metrics.span("stage", stage="notify"):
+                success = send_email_notification(unique_use_cases, product_ideas)
             
             if success:
-                logger.info("Email sent successfully!")
+                # With EMAIL_ASYNC the mailer thread reports delivery while the run finishes up
+                logger.info("Email queued for delivery" if EMAIL_ASYNC else "Email sent successfully!")
             else:
                 logger.error("Failed to send email")
         else:
             logger.warning("No use cases or product ideas found. Sending error notification...")
-            success = send_error_notification(articles)
+            with metrics.span("stage", stage="notify"):
+                success = send_error_notification(articles)
             
             if success:
-                logger.info("Error notification sent successfully!")
+                logger.info("Error notification queued for delivery" if EMAIL_ASYNC
+                            else "Error notification sent successfully!")
             else:
                 logger.error("Failed to send error notification")
         
@@ -194,12 +476,23 @@ def main():
         logger.info("SUMMARY")
         logger.info(f"{'='*60}")
         logger.info(f"Articles processed: {len(articles)}")
+        if seen_index:
+            logger.info(f"Articles skipped: {skipped_seen} seen on earlier runs, {skipped_duplicates} duplicates")
+        if skipped_irrelevant:
+            logger.info(f"Off-topic articles skipped: {skipped_irrelevant} (LLM calls saved)")
         logger.info(f"Total use cases found: {len(all_use_cases)}")
         logger.info(f"Unique use cases: {len(unique_use_cases)}")
         logger.info(f"Product ideas generated: {len(product_ideas)}")
+        if latencies:
+            logger.info(f"Extraction latency: avg {sum(latencies) / len(latencies):.2f}s, max {max(latencies):.2f}s")
+        if ollama_proc.cache:
+            logger.info(f"LLM cache: {ollama_proc.cache.stats()}")
+        if ollama_proc.cascade_policy != "off":
+            logger.info(f"Model cascade: {ollama_proc.cascade_stats()}")
         logger.info(f"Duration: {duration:.2f} seconds")
         logger.info(f"{'='*60}")
         logger.info("AI News Agent completed successfully!")
+        checkpoint.clear()
         logger.info(f"{'='*60}")
         
     except KeyboardInterrupt:
@@ -207,7 +500,45 @@ def main():
     except Exception as e:
         logger.error(f"Unexpected error in main: {e}", exc_info=True)
         raise
+    finally:
+        if checkpoint:
+            checkpoint.close()
+        # Give queued email a bounded chance to finish so its SMTP metrics belong to this run
+        if EMAIL_ASYNC and not get_mailer().flush(EMAIL_FLUSH_TIMEOUT):
+            logger.warning(f"Email still being delivered after {EMAIL_FLUSH_TIMEOUT}s; "
+                           f"its delivery metrics are not in this run's export")
+        export_metrics()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="AI News Agent")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="Bypass the LLM result cache and re-analyze every article")
+    parser.add_argument('--include-seen', action='store_true',
+                        help="Process articles even if they were handled on an earlier run")
+    parser.add_argument('--no-relevance-filter', action='store_true',
+                        help="Send every article to the LLM instead of only relevant ones")
+    parser.add_argument('--full-text', action='store_true',
+                        help="Download full article pages instead of using RSS summaries")
+    parser.add_argument('--stream', action='store_true',
+                        help="Start extracting each feed's articles as soon as it is fetched")
+    parser.add_argument('--cascade', choices=CASCADE_POLICIES,
+                        help="Model cascade policy: let a small model triage or extract first")
+    parser.add_argument('--resume', action='store_true',
+                        help="Continue an interrupted run from its checkpoint, skipping finished articles")
+    parser.add_argument('--resume-max-age', type=float,
+                        help="Seconds after which an interrupted run is discarded instead of resumed")
+    return parser.parse_args(argv)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    setup_logging()
+    args = parse_args()
+    main(use_cache=False if args.no_cache else None,
+         skip_seen=False if args.include_seen else None,
+         resume=args.resume,
+         resume_max_age=args.resume_max_age,
+         full_text=True if args.full_text else None,
+         relevance_filter=False if args.no_relevance_filter else None,
+         streaming=True if args.stream else None,
+         cascade_policy=args.cascade)
\ No newline at end of file
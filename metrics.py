@@ -0,0 +1,164 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+
+def _label_key(labels: Dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: tuple) -> str:
+    if not key:
+        return ""
+    escaped = (
+        f'{k}="' + v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for k, v in key
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+class Metrics:
+    """
+    Thread-safe spans and counters for one pipeline run.
+    Spans record wall time of named operations; counters accumulate values
+    such as request counts or Ollama token counts. Both can be exported as a
+    JSON profile or in the Prometheus text exposition format.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started_at = time.time()
+            self._counters = defaultdict(float)
+            self._spans = []
+
+    def inc(self, name: str, value: float = 1, **labels):
+        with self._lock:
+            self._counters[(name, _label_key(labels))] += value
+
+    def record_span(self, name: str, seconds: float, **labels):
+        with self._lock:
+            self._spans.append({
+                'name': name,
+                'labels': {k: str(v) for k, v in labels.items()},
+                'start': round(time.time() - seconds - self.started_at, 4),
+                'seconds': round(seconds, 6),
+            })
+
+    @contextmanager
+    def span(self, name: str, **labels):
+        """Time a block; labels can be added inside via the yielded dict."""
+        started = time.perf_counter()
+        try:
+            yield labels
+        finally:
+            self.record_span(name, time.perf_counter() - started, **labels)
+
+    def _span_summary(self) -> Dict:
+        summary = {}
+        for span in self._spans:
+            key = span['name'] + _format_labels(_label_key(span['labels']))
+            entry = summary.setdefault(key, {'count': 0, 'total_seconds': 0.0, 'max_seconds': 0.0})
+            entry['count'] += 1
+            entry['total_seconds'] = round(entry['total_seconds'] + span['seconds'], 6)
+            entry['max_seconds'] = max(entry['max_seconds'], span['seconds'])
+        return summary
+
+    def to_profile(self) -> Dict:
+        with self._lock:
+            return {
+                'started_at': self.started_at,
+                'duration_seconds': round(time.time() - self.started_at, 4),
+                'summary': self._span_summary(),
+                'counters': [
+                    {'name': name, 'labels': dict(key), 'value': value}
+                    for (name, key), value in sorted(self._counters.items())
+                ],
+                'spans': list(self._spans),
+            }
+
+    def to_prometheus(self, prefix: str = "news_agent") -> str:
+        lines = []
+        with self._lock:
+            counters = defaultdict(list)
+            for (name, key), value in self._counters.items():
+                counters[name].append((key, value))
+            for name in sorted(counters):
+                lines.append(f"# TYPE {prefix}_{name} counter")
+                for key, value in sorted(counters[name]):
+                    lines.append(f"{prefix}_{name}{_format_labels(key)} {value:g}")
+
+            durations = defaultdict(lambda: [0, 0.0])
+            for span in self._spans:
+                entry = durations[(span['name'], _label_key(span['labels']))]
+                entry[0] += 1
+                entry[1] += span['seconds']
+            names = sorted({name for name, _ in durations})
+            for name in names:
+                lines.append(f"# TYPE {prefix}_{name}_seconds summary")
+                for (span_name, key), (count, total) in sorted(durations.items()):
+                    if span_name == name:
+                        lines.append(f"{prefix}_{name}_seconds_count{_format_labels(key)} {count}")
+                        lines.append(f"{prefix}_{name}_seconds_sum{_format_labels(key)} {total:.6f}")
+
+            lines.append(f"# TYPE {prefix}_run_start_timestamp_seconds gauge")
+            lines.append(f"{prefix}_run_start_timestamp_seconds {self.started_at:.3f}")
+        return "\n".join(lines) + "\n"
+
+    def write_profile(self, path: str):
+        _atomic_write(path, json.dumps(self.to_profile(), indent=2))
+        logger.info(f"Saved run profile to {path}")
+
+    def write_prometheus_textfile(self, path: str):
+        # Atomic rename so node_exporter never scrapes a half-written file
+        _atomic_write(path, self.to_prometheus())
+
+
+def _atomic_write(path: str, text: str):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+# Process-wide registry used by every pipeline module
+metrics = Metrics()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.to_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serve /metrics for Prometheus scraping from a background thread."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+    return server
@@ -1,8 +1,9 @@
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+import html
 import logging
-from config import EMAIL_USER, EMAIL_PASS, EMAIL_TO
+from config import (EMAIL_USER, EMAIL_PASS, EMAIL_TO, SMTP_LOGIN, EMAIL_MAX_USE_CASES, EMAIL_MAX_PRODUCT_IDEAS,
+                    EMAIL_FULL_REPORT_URL)
+from mailer import get_mailer
+from metrics import metrics
 import urllib3
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -10,9 +11,32 @@ urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 logger = logging.getLogger(__name__)
 
 
-def format_html_email(use_cases, product_ideas=None):
-    """Create nicely formatted HTML email"""
-    html = f"""
+class _Template:
+    """
+    A str.format-style template, bound once at import time.
+    render() appends the filled-in text to a parts list with every field
+    value escaped, so a whole email is built with a single ''.join.
+    """
+    
+    def __init__(self, text, escape=None):
+        self._format = text.format
+        self._escape = escape
+    
+    def render(self, out, **values):
+        escape = self._escape
+        if escape is not None:
+            values = {name: escape(str(value)) for name, value in values.items()}
+        out.append(self._format(**values))
+
+
+def _escape_html(value):
+    return html.escape(value, quote=True)
+
+
+_RULE = "=" * 70
+_DASH = "-" * 70
+
+_HTML_HEAD = _Template("""
     <html>
     <head>
         <style>
@@ -22,19 +46,12 @@ def format_html_email(use_cases, product_ideas=None):
             .section-title {{ background: #667eea; color: white; padding: 15px; margin: 30px 0 20px 0; border-radius: 6px; font-size: 20px; font-weight: bold; }}
             .product-idea {{ background: linear-gradient(135deg, #f5f7fa 0%, #c3cfe2 100%); padding: 25px; margin: 20px 0; border: 2px solid #667eea; border-radius: 10px; box-shadow: 0 4px 6px rgba(0,0,0,0.1); }}
             .product-idea h3 {{ margin: 0 0 10px 0; color: #667eea; font-size: 22px; }}
-            .product-tagline {{ font-style: italic; color: #555; margin-bottom: 15px; }}
-            .product-detail {{ margin: 10px 0; padding: 8px; background: white; border-radius: 4px; }}
-            .detail-label {{ font-weight: bold; color: #667eea; display: inline-block; width: 130px; }}
             .use-case {{ background: white; padding: 20px; margin: 15px 0; border: 1px solid #e0e0e0; border-radius: 8px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); }}
             .use-case h3 {{ margin: 0 0 15px 0; color: #764ba2; font-size: 18px; }}
             .detail {{ margin: 8px 0; padding-left: 10px; }}
             .label {{ font-weight: bold; color: #555; }}
+            .more {{ padding: 15px; margin: 15px 0; background: #f8f9fa; border-radius: 6px; text-align: center; }}
             .footer {{ margin-top: 40px; padding-top: 20px; border-top: 2px solid #e0e0e0; color: #777; font-size: 12px; text-align: center; }}
-            .badge {{ display: inline-block; padding: 4px 12px; border-radius: 12px; font-size: 12px; font-weight: bold; margin: 5px 5px 5px 0; }}
-            .badge-easy {{ background: #d4edda; color: #155724; }}
-            .badge-medium {{ background: #fff3cd; color: #856404; }}
-            .badge-hard {{ background: #f8d7da; color: #721c24; }}
-            ul {{ margin: 5px 0; padding-left: 20px; }}
         </style>
     </head>
     <body>
@@ -45,98 +62,167 @@ def format_html_email(use_cases, product_ideas=None):
         
         <div class="summary">
             <strong>📊 Today's Summary:</strong><br>
-            ✅ Found <strong>{len(use_cases)}</strong> AI use cases<br>
-            {'✅ Generated <strong>' + str(len(product_ideas)) + '</strong> product ideas<br>' if product_ideas else ''}
-        </div>
-    """
-    
-    # Product Ideas Section (Updated to handle list of strings)
-    if product_ideas and len(product_ideas) > 0:
-        html += '<div class="section-title">💡 PRODUCT IDEAS YOU CAN BUILD</div>'
-        
-        for i, idea_str in enumerate(product_ideas, 1): # Iterate over strings directly
-            # Since product_ideas is now a list of strings, we cannot extract structured data.
-            # We will display the raw string as the idea.
-            html += f"""
+            ✅ Found <strong>{use_case_count}</strong> AI use cases<br>
+""", _escape_html)
+_HTML_IDEA_COUNT = _Template("""            ✅ Generated <strong>{idea_count}</strong> product ideas<br>
+""", _escape_html)
+_HTML_SUMMARY_END = """        </div>
+"""
+_HTML_SECTION = _Template("""        <div class="section-title">{title}</div>
+""", _escape_html)
+_HTML_IDEA = _Template("""
             <div class="product-idea">
-                <h3>💡 {i}. {idea_str}</h3>
-                <!-- Note: Specific details like difficulty, target market, etc., are not available for raw strings -->
+                <h3>💡 {number}. {idea}</h3>
             </div>
-            """
-    
-    # Use Cases Section (Keep original logic for use_cases dicts)
-    html += '<div class="section-title">📋 TODAY\'S AI USE CASES</div>'
-    
-    for i, uc in enumerate(use_cases, 1):
-        html += f"""
+""", _escape_html)
+_HTML_USE_CASE = _Template("""
         <div class="use-case">
-            <h3>{i}. {uc.get('product', 'Unknown Product')}</h3>
+            <h3>{number}. {product}</h3>
             <div class="detail">
-                <span class="label">📋 Use Case:</span> {uc.get('use_case', 'N/A')}
+                <span class="label">📋 Use Case:</span> {use_case}
             </div>
             <div class="detail">
-                <span class="label">🏢 Industry:</span> {uc.get('industry', 'Not specified')}
+                <span class="label">🏢 Industry:</span> {industry}
             </div>
             <div class="detail">
-                <span class="label">✨ Benefit:</span> {uc.get('benefit', 'Not specified')}
+                <span class="label">✨ Benefit:</span> {benefit}
             </div>
         </div>
-        """
-    
-    html += """
+""", _escape_html)
+_HTML_MORE = _Template("""
+        <div class="more">…and {count} more {what} in the full report</div>
+""", _escape_html)
+_HTML_MORE_LINK = _Template("""
+        <div class="more">…and {count} more {what} in the <a href="{url}">full report</a></div>
+""", _escape_html)
+_HTML_FOOT = _Template("""
         <div class="footer">
             <p>🤖 Generated by AI News Agent | Powered by Ollama (Local AI)</p>
             <p>This report analyzes today's AI news to extract actionable business opportunities</p>
         </div>
     </body>
     </html>
-    """
-    return html
+""")
 
+_TEXT_HEAD = _Template("""{rule}
+DAILY AI BUSINESS INTELLIGENCE
+{rule}
 
-def format_plain_text(use_cases, product_ideas=None):
-    """Create plain text version of email"""
-    body = "=" * 70 + "\n"
-    body += "DAILY AI BUSINESS INTELLIGENCE\n"
-    body += "=" * 70 + "\n\n"
-    body += f"Found {len(use_cases)} use cases from today's AI news\n"
-    if product_ideas:
-        body += f"Generated {len(product_ideas)} product ideas\n"
-    body += "\n"
-    
-    # Product Ideas (Updated to handle list of strings)
-    if product_ideas and len(product_ideas) > 0:
-        body += "=" * 70 + "\n"
-        body += "PRODUCT IDEAS YOU CAN BUILD\n"
-        body += "=" * 70 + "\n\n"
-        
-        for i, idea_str in enumerate(product_ideas, 1): # Iterate over strings directly
-            body += f"{i}. {idea_str}\n" # Print the raw string
-            body += "-" * 70 + "\n" # Separator
-            # Note: Specific details like difficulty, target market, etc., are not available for raw strings
-            body += "\n"
+Found {use_case_count} use cases from today's AI news
+""")
+_TEXT_IDEA_COUNT = _Template("Generated {idea_count} product ideas\n")
+_TEXT_SECTION = _Template("""{rule}
+{title}
+{rule}
+
+""")
+_TEXT_IDEA = _Template("""{number}. {idea}
+{dash}
+
+""")
+_TEXT_USE_CASE = _Template("""{number}. {product}
+{dash}
+   Use Case: {use_case}
+   Industry: {industry}
+   Benefit: {benefit}
+
+""")
+_TEXT_MORE = _Template("...and {count} more {what} in the full report{link}\n\n")
+_TEXT_FOOT = _Template("""{rule}
+Generated by AI News Agent | Powered by Ollama (Local AI)
+""")
+
+
+def _capped(items, limit):
+    """The first `limit` items (all if limit is falsy) and how many were left out"""
+    if not limit or len(items) <= limit:
+        return items, 0
+    return items[:limit], len(items) - limit
+
+
+def _render_more(plain, rich, count, what):
+    url = EMAIL_FULL_REPORT_URL
+    _TEXT_MORE.render(plain, count=count, what=what, link=f": {url}" if url else "")
+    if url:
+        _HTML_MORE_LINK.render(rich, count=count, what=what, url=url)
+    else:
+        _HTML_MORE.render(rich, count=count, what=what)
+
+
+def render_email(use_cases, product_ideas=None):
+    """
+    Render the plain text and HTML bodies in one pass over the data.
+    Only the first EMAIL_MAX_PRODUCT_IDEAS ideas and EMAIL_MAX_USE_CASES use
+    cases are included, followed by a pointer to the full report, so large
+    runs stay under Gmail's clipping size. Returns (plain_text, html_text).
+    """
+    product_ideas = product_ideas or []
+    plain, rich = [], []
     
-    # Use Cases (Keep original logic for use_cases dicts)
-    body += "=" * 70 + "\n"
-    body += "TODAY'S AI USE CASES\n"
-    body += "=" * 70 + "\n\n"
+    _TEXT_HEAD.render(plain, rule=_RULE, use_case_count=len(use_cases))
+    _HTML_HEAD.render(rich, use_case_count=len(use_cases))
+    if product_ideas:
+        _TEXT_IDEA_COUNT.render(plain, idea_count=len(product_ideas))
+        _HTML_IDEA_COUNT.render(rich, idea_count=len(product_ideas))
+    plain.append("\n")
+    rich.append(_HTML_SUMMARY_END)
     
-    for i, uc in enumerate(use_cases, 1):
-        body += f"{i}. {uc.get('product', 'Unknown Product')}\n"
-        body += "-" * 70 + "\n"
-        body += f"   Use Case: {uc.get('use_case', 'N/A')}\n"
-        body += f"   Industry: {uc.get('industry', 'Not specified')}\n"
-        body += f"   Benefit: {uc.get('benefit', 'Not specified')}\n\n"
+    if product_ideas:
+        _TEXT_SECTION.render(plain, rule=_RULE, title="PRODUCT IDEAS YOU CAN BUILD")
+        _HTML_SECTION.render(rich, title="💡 PRODUCT IDEAS YOU CAN BUILD")
+        shown, hidden = _capped(product_ideas, EMAIL_MAX_PRODUCT_IDEAS)
+        for number, idea in enumerate(shown, 1):
+            _TEXT_IDEA.render(plain, number=number, idea=idea, dash=_DASH)
+            _HTML_IDEA.render(rich, number=number, idea=idea)
+        if hidden:
+            _render_more(plain, rich, hidden, "product ideas")
     
-    body += "=" * 70 + "\n"
-    body += "Generated by AI News Agent | Powered by Ollama (Local AI)\n"
+    _TEXT_SECTION.render(plain, rule=_RULE, title="TODAY'S AI USE CASES")
+    _HTML_SECTION.render(rich, title="📋 TODAY'S AI USE CASES")
+    shown, hidden = _capped(use_cases, EMAIL_MAX_USE_CASES)
+    for number, uc in enumerate(shown, 1):
+        values = {
+            'number': number,
+            'product': uc.get('product', 'Unknown Product'),
+            'use_case': uc.get('use_case', 'N/A'),
+            'industry': uc.get('industry', 'Not specified'),
+            'benefit': uc.get('benefit', 'Not specified'),
+        }
+        _TEXT_USE_CASE.render(plain, dash=_DASH, **values)
+        _HTML_USE_CASE.render(rich, **values)
+    if hidden:
+        _render_more(plain, rich, hidden, "use cases")
     
-    return body
+    _TEXT_FOOT.render(plain, rule=_RULE)
+    _HTML_FOOT.render(rich)
+    return ''.join(plain), ''.join(rich)
+
 
+def format_html_email(use_cases, product_ideas=None):
+    """Create nicely formatted HTML email"""
+    return render_email(use_cases, product_ideas)[1]
 
-def send_email_notification(use_cases, product_ideas=None):
-    """Send use cases and product ideas via email"""
-    if not all([EMAIL_USER, EMAIL_PASS, EMAIL_TO]):
+
+def format_plain_text(use_cases, product_ideas=None):
+    """Create plain text version of email"""
+    return render_email(use_cases, product_ideas)[0]
+
+
+def _email_configured():
+    return bool(EMAIL_USER and EMAIL_TO and (EMAIL_PASS or not SMTP_LOGIN))
+
+
+def _recipients():
+    return [email.strip() for email in EMAIL_TO.split(',') if email.strip()]
+
+
+def send_email_notification(use_cases, product_ideas=None, block=None):
+    """
+    Send use cases and product ideas via email.
+    Delivery runs on the mailer's background thread unless `block` is set
+    (or EMAIL_ASYNC is off), in which case this returns the delivery result.
+    """
+    if not _email_configured():
         logger.error("Email settings not configured")
         return False
     
@@ -145,51 +231,31 @@ def send_email_notification(use_cases, product_ideas=None):
         return False
     
     try:
-        recipients = [email.strip() for email in EMAIL_TO.split(',')]
+        recipients = _recipients()
         logger.info(f"Sending to {len(recipients)} recipients")
         
-        msg = MIMEMultipart('alternative')
         ideas_count = len(product_ideas) if product_ideas else 0
-        msg['Subject'] = f"🚀 Daily AI Intelligence - {len(use_cases)} Use Cases + {ideas_count} Product Ideas"
-        msg['From'] = EMAIL_USER
-        msg['To'] = ', '.join(recipients)
-        
-        plain_text = format_plain_text(use_cases, product_ideas)
-        html_text = format_html_email(use_cases, product_ideas)
-        
-        part1 = MIMEText(plain_text, 'plain')
-        part2 = MIMEText(html_text, 'html')
-        
-        msg.attach(part1)
-        msg.attach(part2)
+        subject = f"🚀 Daily AI Intelligence - {len(use_cases)} Use Cases + {ideas_count} Product Ideas"
         
-        logger.info("Connecting to SMTP server...")
-        server = smtplib.SMTP('smtp.gmail.com', 587)
-        server.starttls()
-        server.login(EMAIL_USER, EMAIL_PASS)
-        server.send_message(msg)
-        server.quit()
+        with metrics.span("render"):
+            plain_text, html_text = render_email(use_cases, product_ideas)
+        metrics.inc("email_bytes_total", len(plain_text.encode('utf-8')) + len(html_text.encode('utf-8')))
         
-        logger.info(f"✅ Email sent successfully to {len(recipients)} recipients")
-        return True
+        return get_mailer().send(subject, plain_text, html_text, recipients, kind="report", block=block)
         
     except Exception as e:
         logger.error(f"Error sending email: {e}")
         return False
 
 
-def send_error_notification(articles):
+def send_error_notification(articles, block=None):
     """Send email when agent runs but finds no use cases"""
-    if not all([EMAIL_USER, EMAIL_PASS, EMAIL_TO]):
+    if not _email_configured():
         return False
     
     try:
-        recipients = [email.strip() for email in EMAIL_TO.split(',')]
-        
-        msg = MIMEMultipart('alternative')
-        msg['Subject'] = "⚠️ AI News Agent - No Data Found"
-        msg['From'] = EMAIL_USER
-        msg['To'] = ', '.join(recipients)
+        recipients = _recipients()
+        subject = "⚠️ AI News Agent - No Data Found"
         
         plain_text = f"""
 AI News Agent Report
@@ -218,17 +284,7 @@ Please check if Ollama is running ('ollama serve')
         </html>
         """
         
-        msg.attach(MIMEText(plain_text, 'plain'))
-        msg.attach(MIMEText(html_text, 'html'))
-        
-        server = smtplib.SMTP('smtp.gmail.com', 587)
-        server.starttls()
-        server.login(EMAIL_USER, EMAIL_PASS)
-        server.send_message(msg)
-        server.quit()
-        
-        logger.info("Error notification sent")
-        return True
+        return get_mailer().send(subject, plain_text, html_text, recipients, kind="error", block=block)
         
     except Exception as e:
         logger.error(f"Error sending notification: {e}")
@@ -0,0 +1,423 @@
+import json
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Union
+import requests
+from requests.adapters import HTTPAdapter
+import config
+from llm_json import JsonStreamScanner
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """
+    Stop calling Ollama after repeated failures.
+    Opens after `threshold` consecutive failures and lets a single trial
+    request through once `cooldown` seconds have passed.
+    """
+
+    def __init__(self, threshold: int, cooldown: float, name: str = "Ollama"):
+        self.name = name
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.cooldown or self._trial_in_flight:
+                return False
+            # Half-open: let one request probe the server
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._failures >= self.threshold:
+                if self._opened_at is None:
+                    logger.error(f"{self.name} failed {self._failures} times in a row, pausing calls for {self.cooldown}s")
+                self._opened_at = time.monotonic()
+
+    def trip(self):
+        """Open immediately, e.g. when a health check fails."""
+        with self._lock:
+            self._failures = max(self._failures, self.threshold)
+            self._trial_in_flight = False
+            self._opened_at = time.monotonic()
+
+    @property
+    def is_open(self) -> bool:
+        with self._lock:
+            return self._opened_at is not None
+
+
+class OllamaNode:
+    """One Ollama server: its URL, circuit breaker and requests in flight."""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip('/')
+        self.breaker = CircuitBreaker(config.OLLAMA_BREAKER_THRESHOLD, config.OLLAMA_BREAKER_COOLDOWN,
+                                      name=f"Ollama at {self.url}")
+        self.outstanding = 0
+
+
+class OllamaClient:
+    """
+    Pooled keep-alive HTTP client for the Ollama API with one retry policy.
+    Given several servers, each request goes to the healthy node with the
+    fewest requests in flight. A node whose breaker opens (repeated
+    failures or a failed health check) is ejected until it recovers, and a
+    failed request is retried on another node. Every attempt is sent to one
+    node only, so no extraction is ever generated twice.
+    """
+
+    RETRYABLE_STATUS = {500, 502, 503, 504}
+
+    def __init__(self, base_url: Union[str, List[str]] = None, timeout: float = None, max_retries: int = None,
+                 pool_size: int = None):
+        if base_url is None:
+            base_url = config.OLLAMA_HOSTS or [config.OLLAMA_HOST]
+        urls = [base_url] if isinstance(base_url, str) else list(base_url)
+        self.nodes = [OllamaNode(url) for url in urls]
+        self.base_url = self.nodes[0].url
+        self.timeout = timeout or config.OLLAMA_TIMEOUT
+        self.max_retries = max_retries or config.MAX_RETRIES
+        pool_size = pool_size or config.OLLAMA_POOL_SIZE
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(self.nodes), pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._nodes_lock = threading.Lock()
+        self._warm_models = set()
+        self._stop_health_checks = threading.Event()
+        if len(self.nodes) > 1 and config.OLLAMA_HEALTH_CHECK_INTERVAL:
+            threading.Thread(target=self._health_check_loop, name="ollama-health", daemon=True).start()
+
+    @property
+    def breaker(self) -> CircuitBreaker:
+        """The first node's breaker, for single-server callers."""
+        return self.nodes[0].breaker
+
+    def _acquire_node(self, tried: set) -> Optional[OllamaNode]:
+        """
+        Reserve the least loaded node whose breaker admits a request,
+        preferring nodes this request has not failed on yet.
+        """
+        with self._nodes_lock:
+            fresh = [node for node in self.nodes if node.url not in tried]
+            for candidates in (fresh, self.nodes):
+                for node in sorted(candidates, key=lambda n: n.outstanding):
+                    if node.breaker.allow():
+                        node.outstanding += 1
+                        return node
+        return None
+
+    def _release_node(self, node: OllamaNode):
+        with self._nodes_lock:
+            node.outstanding -= 1
+
+    def check_health(self, node: OllamaNode) -> bool:
+        """Probe a node; failures eject it and a success reinstates it."""
+        try:
+            healthy = self.session.get(f"{node.url}/api/version", timeout=config.OLLAMA_HEALTH_CHECK_TIMEOUT).ok
+        except requests.exceptions.RequestException:
+            healthy = False
+
+        if healthy and node.breaker.is_open:
+            logger.info(f"Ollama node {node.url} is healthy again")
+            node.breaker.record_success()
+        elif not healthy and not node.breaker.is_open:
+            logger.warning(f"Ollama node {node.url} failed its health check, ejecting it")
+            metrics.inc("ollama_node_ejections_total", node=node.url)
+            node.breaker.trip()
+        return healthy
+
+    def _health_check_loop(self):
+        while not self._stop_health_checks.wait(config.OLLAMA_HEALTH_CHECK_INTERVAL):
+            for node in self.nodes:
+                self.check_health(node)
+
+    def _backoff(self, attempt: int) -> float:
+        """Exponential backoff with full jitter."""
+        ceiling = min(config.OLLAMA_RETRY_MAX_DELAY, config.OLLAMA_RETRY_BASE_DELAY * (2 ** attempt))
+        return random.uniform(0, ceiling)
+
+    def _read_stream(self, response, expect: type = list, trailing_chunks: int = 0) -> Optional[Dict]:
+        """
+        Consume /api/chat NDJSON chunks and stop as soon as the accumulated
+        text contains a complete JSON value of the expected type. Closing the
+        response makes Ollama abort the generation, so no tokens are wasted
+        on trailing prose.
+        Up to `trailing_chunks` more chunks are read after the value so the
+        final 'done' chunk, which carries Ollama's token counts and
+        durations, is kept when it follows right behind (as it does with
+        schema-constrained output). If generation is cut off first, the
+        usage fields are estimated from the stream: one chunk per token,
+        prompt evaluation up to the first token, and generation after it.
+        Returns a dict shaped like a non-streamed response, plus the
+        time to the first generated token in 'first_token_seconds'.
+        """
+        scanner = JsonStreamScanner(expect)
+        result = {}
+        read_started = time.perf_counter()
+        first_token_seconds = None
+        token_chunks = 0
+        remaining = None
+        try:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                try:
+                    chunk = json.loads(line)
+                except ValueError:
+                    logger.warning(f"Skipping malformed stream chunk: {line[:200]}")
+                    continue
+
+                if chunk.get('error'):
+                    logger.error(f"Ollama stream error: {chunk['error']}")
+                    return None
+
+                if chunk.get('done'):
+                    result = chunk
+                    break
+
+                piece = chunk.get('message', {}).get('content', '')
+                if piece:
+                    token_chunks += 1
+                if piece and first_token_seconds is None:
+                    # elapsed covers the wait for response headers, which includes any model load
+                    first_token_seconds = response.elapsed.total_seconds() + time.perf_counter() - read_started
+
+                if remaining is not None:
+                    remaining -= 1
+                    if remaining < 0:
+                        break
+                elif piece and scanner.feed(piece):
+                    logger.debug("Complete JSON value received, stopping generation early")
+                    remaining = trailing_chunks
+                    if remaining == 0:
+                        break
+        finally:
+            response.close()
+
+        if not result.get('done'):
+            # Stopped early: estimate what the final chunk would have reported
+            result = {'done': False, 'early_stop': True, 'usage_estimated': True, 'eval_count': token_chunks}
+            if first_token_seconds is not None:
+                result['prompt_eval_duration'] = int(first_token_seconds * 1e9)
+                generation = response.elapsed.total_seconds() + time.perf_counter() - read_started
+                result['eval_duration'] = int(max(0.0, generation - first_token_seconds) * 1e9)
+
+        content = scanner.json_text if scanner.result is not None else scanner.text
+        result['message'] = {'role': 'assistant', 'content': content}
+        result['first_token_seconds'] = first_token_seconds
+        return result
+
+    def chat(self, payload: Dict, expect: type = list) -> Optional[Dict]:
+        """
+        POST a payload to /api/chat and return the decoded JSON, or None on failure.
+        Payloads with "stream": True are read incrementally via _read_stream,
+        which stops once a JSON value of type `expect` has been generated.
+        """
+        payload = self._with_model_options(payload)
+        model = payload.get('model', config.OLLAMA_MODEL)
+        # Requests sent before the model is known to be loaded may pay its load time
+        state = 'warm' if model in self._warm_models else 'cold'
+        with metrics.span("ollama_request", model=model) as labels:
+            data = self._chat(payload, expect, model)
+            labels['outcome'] = 'ok' if data is not None else 'failed'
+        if data:
+            self._warm_models.add(model)
+            self._record_usage(model, data, state)
+        return data
+
+    @staticmethod
+    def _with_model_options(payload: Dict) -> Dict:
+        """
+        Apply the configured keep_alive and num_ctx unless the caller set them.
+        Every request must use the same num_ctx, since a different one makes
+        Ollama reload the model.
+        """
+        payload = dict(payload)
+        if config.OLLAMA_KEEP_ALIVE is not None:
+            payload.setdefault('keep_alive', config.OLLAMA_KEEP_ALIVE)
+        if config.OLLAMA_NUM_CTX:
+            payload['options'] = {'num_ctx': config.OLLAMA_NUM_CTX, **payload.get('options', {})}
+        return payload
+
+    @staticmethod
+    def _record_usage(model: str, data: Dict, state: str):
+        """Accumulate Ollama's token counts and durations (reported in nanoseconds)."""
+        if data.get('first_token_seconds') is not None:
+            metrics.record_span("ollama_first_token", data['first_token_seconds'], model=model, state=state)
+        for field in ('prompt_eval_count', 'eval_count'):
+            if data.get(field):
+                metrics.inc(f"ollama_{field}_total", data[field], model=model)
+        for field in ('prompt_eval_duration', 'eval_duration', 'load_duration', 'total_duration'):
+            if data.get(field):
+                metrics.inc(f"ollama_{field}_seconds_total", data[field] / 1e9, model=model)
+        if data.get('early_stop'):
+            metrics.inc("ollama_early_stops_total", model=model)
+        if data.get('usage_estimated'):
+            metrics.inc("ollama_usage_estimated_total", model=model)
+        if data.get('prompt_eval_count') is not None:
+            logger.info(f"{model}: {data['prompt_eval_count']} prompt + {data.get('eval_count', 0)} output tokens "
+                        f"in {data.get('total_duration', 0) / 1e9:.2f}s")
+        elif data.get('eval_count') is not None:
+            logger.info(f"{model}: ~{data['eval_count']} output tokens (stopped before Ollama's token counts)")
+
+    def _chat(self, payload: Dict, expect: type, model: str) -> Optional[Dict]:
+        stream = bool(payload.get('stream'))
+        tried = set()
+
+        for attempt in range(self.max_retries):
+            node = self._acquire_node(tried)
+            if node is None:
+                metrics.inc("ollama_breaker_rejections_total", model=model)
+                logger.error("Ollama circuit breaker is open on every node, skipping request")
+                return None
+            if tried and node.url not in tried:
+                metrics.inc("ollama_failovers_total", model=model, node=node.url)
+                logger.info(f"Failing over to Ollama node {node.url}")
+            tried.add(node.url)
+
+            try:
+                response = self.session.post(f"{node.url}/api/chat", json=payload, timeout=self.timeout,
+                                             stream=stream)
+                logger.debug(f"Ollama API request: {payload}")
+                logger.debug(f"Ollama API response status: {response.status_code}")
+                metrics.inc("ollama_http_responses_total", model=model, status=response.status_code)
+
+                if response.status_code == 200:
+                    if stream:
+                        # Constrained output ends with the JSON value, so the final chunk is close behind
+                        trailing = config.OLLAMA_STREAM_TRAILING_CHUNKS if payload.get('format') else 0
+                        data = self._read_stream(response, expect, trailing)
+                        node.breaker.record_success()
+                        return data
+                    node.breaker.record_success()
+                    try:
+                        return response.json()
+                    except ValueError as e:
+                        logger.error(f"Failed to decode JSON response from Ollama: {e}")
+                        logger.error(f"Response text was: {response.text[:500]}")
+                        return None
+
+                if response.status_code == 404:
+                    # The server answered, so it is healthy; the model is just missing
+                    node.breaker.record_success()
+                    logger.error(f"Model {model} not found on {node.url}. Run: ollama pull {model}")
+                    return None
+
+                if response.status_code not in self.RETRYABLE_STATUS:
+                    node.breaker.record_success()
+                    logger.error(f"Ollama API error {response.status_code}: {response.text[:500]}")
+                    return None
+
+                node.breaker.record_failure()
+                logger.warning(f"Ollama error {response.status_code} from {node.url} on attempt {attempt + 1}: "
+                               f"{response.text[:500]}")
+
+            except requests.exceptions.RequestException as e:
+                node.breaker.record_failure()
+                metrics.inc("ollama_request_errors_total", model=model, error=type(e).__name__)
+                logger.warning(f"Ollama request error from {node.url} on attempt {attempt + 1}: {e}")
+            finally:
+                self._release_node(node)
+
+            if attempt < self.max_retries - 1:
+                metrics.inc("ollama_retries_total", model=model)
+                if len(tried) < len(self.nodes):
+                    # Another node is untried, so there is nothing to wait for
+                    continue
+                delay = self._backoff(attempt)
+                logger.info(f"Retrying in {delay:.1f} seconds...")
+                time.sleep(delay)
+
+        logger.error("Max retries reached for Ollama request.")
+        return None
+
+    def is_loaded(self, node: OllamaNode, model: str) -> bool:
+        """Whether `model` is currently in memory on `node`, per /api/ps."""
+        try:
+            response = self.session.get(f"{node.url}/api/ps", timeout=config.OLLAMA_HEALTH_CHECK_TIMEOUT)
+            loaded = response.json().get('models') or []
+        except (requests.exceptions.RequestException, ValueError):
+            return False
+        return any(model in (entry.get('name'), entry.get('model')) for entry in loaded)
+
+    def _warm_node(self, node: OllamaNode, payload: Dict) -> bool:
+        model = payload['model']
+        state = 'warm' if self.is_loaded(node, model) else 'cold'
+        started = time.perf_counter()
+        try:
+            response = self.session.post(f"{node.url}/api/chat", json=payload, timeout=self.timeout)
+            ok = response.status_code == 200
+            if not ok:
+                logger.warning(f"Warm-up of {model} on {node.url} returned {response.status_code}")
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Warm-up of {model} on {node.url} failed: {e}")
+            ok = False
+        elapsed = time.perf_counter() - started
+        metrics.record_span("ollama_warmup", elapsed, model=model, node=node.url, state=state,
+                            outcome='ok' if ok else 'failed')
+        if ok and state == 'cold':
+            logger.info(f"Loaded {model} on {node.url} in {elapsed:.1f}s")
+        return ok
+
+    def keep_warm(self, model: str = None, keep_alive=None) -> bool:
+        """
+        Load the model on every node (if needed) and ask Ollama to keep it
+        in memory for `keep_alive` (a duration such as "65m", seconds, or a
+        negative value for forever; default OLLAMA_KEEP_ALIVE).
+        A chat request without messages loads the model without generating.
+        Each node's load time is recorded as an ollama_warmup span labelled
+        cold or warm. Returns True if at least one node is ready.
+        """
+        payload = self._with_model_options({"model": model or config.OLLAMA_MODEL, "messages": []})
+        if keep_alive is not None:
+            payload["keep_alive"] = keep_alive
+
+        # A model that unloaded since the last request is cold again until warmed
+        self._warm_models.discard(payload['model'])
+        with ThreadPoolExecutor(max_workers=len(self.nodes)) as executor:
+            results = list(executor.map(lambda node: self._warm_node(node, payload), self.nodes))
+        if all(results):
+            self._warm_models.add(payload['model'])
+        return any(results)
+
+    def close(self):
+        self._stop_health_checks.set()
+        self.session.close()
+
+
+_shared_client = None
+_shared_lock = threading.Lock()
+
+
+def get_client() -> OllamaClient:
+    """Return the process-wide client so all callers share one connection pool."""
+    global _shared_client
+    with _shared_lock:
+        if _shared_client is None:
+            _shared_client = OllamaClient()
+        return _shared_client
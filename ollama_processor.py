@@ -1,152 +1,351 @@
 import logging
-import requests
+import threading
 import time
-import json
-import re
+from collections import Counter
 from typing import List, Dict, Optional
 import config # Import the config module
+from llm_cache import LLMCache
+from metrics import metrics
+from ollama_client import OllamaClient, get_client
+from llm_json import STRING_LIST_SCHEMA, keyed_lists_schema, clean_string_list, parse_json, parse_string_list
+from token_budget import context_window, estimate_tokens, fit_prompt
 
 logger = logging.getLogger(__name__)
 
+CASCADE_POLICIES = ("off", "validate", "triage")
+TRIAGE_SCHEMA = {
+    "type": "object",
+    "properties": {"relevant": {"type": "boolean"}},
+    "required": ["relevant"],
+}
+
 class OllamaProcessor:
-    def __init__(self, base_url: str = None):
+    def __init__(self, base_url: str = None, use_cache: bool = None, cascade_policy: str = None):
         # Use the base URL from config (e.g., http://localhost:11434)
         # The script will append /api/chat internally
         self.base_url = base_url or config.OLLAMA_HOST # Use base URL from config if not provided
         # Read model name from config
         self.model_name = config.OLLAMA_MODEL # Now reads from config.OLLAMA_MODEL
+        # Share one pooled connection unless pointed at a different server
+        self.client = get_client() if base_url is None else OllamaClient(base_url)
+        # Cache extraction results on disk so unchanged articles skip the LLM
+        if use_cache is None:
+            use_cache = config.LLM_CACHE_ENABLED
+        self.cache = LLMCache() if use_cache else None
+        # Route articles through a small model first (see config.CASCADE_POLICY)
+        self.cascade_policy = cascade_policy or config.CASCADE_POLICY
+        if self.cascade_policy not in CASCADE_POLICIES:
+            raise ValueError(f"Unknown cascade policy {self.cascade_policy!r}, expected one of {CASCADE_POLICIES}")
+        self.small_model = config.CASCADE_SMALL_MODEL
+        self._routes = Counter()
+        self._large_seconds = 0.0
+        self._large_calls = 0
+        self._unpriced = []
+        self._seconds_saved = 0.0
+        self._seconds_lost = 0.0
+        self._cascade_lock = threading.Lock()
 
-    def _make_request(self, payload: Dict) -> Optional[Dict]:
-        """Make a request to the Ollama API."""
-        # Construct the full URL for the chat endpoint
-        url = f"{self.base_url}/api/chat"
-        max_retries = 3
-        retry_delay = 5
+    def _make_request(self, payload: Dict, expect: type = list) -> Optional[Dict]:
+        """Make a request to the Ollama API through the shared pooled client."""
+        return self.client.chat(payload, expect=expect)
 
-        for attempt in range(max_retries):
-            try:
-                response = requests.post(url, json=payload, timeout=config.OLLAMA_TIMEOUT) # Use timeout from config
-                logger.debug(f"Ollama API request: {payload}")
-                logger.debug(f"Ollama API response status: {response.status_code}")
-                logger.debug(f"Ollama API response text: {response.text}")
-
-                if response.status_code == 200:
-                    try:
-                        return response.json()
-                    except requests.exceptions.JSONDecodeError as e:
-                        logger.error(f"Failed to decode JSON response from Ollama: {e}")
-                        logger.error(f"Response text was: {response.text}")
-                        return None
-                elif response.status_code == 404:
-                     logger.error(f"Model {self.model_name} not found by Ollama. Please check the model name and ensure it's pulled.")
-                     return None
-                elif response.status_code == 500:
-                    logger.error(f"Ollama error 500 on attempt {attempt + 1}: {response.text}")
-                    if attempt < max_retries - 1:
-                        logger.info(f"Retrying in {retry_delay} seconds...")
-                        time.sleep(retry_delay)
-                    else:
-                        logger.error("Max retries reached for Ollama 500 error.")
-                        return None
-                else:
-                    logger.error(f"Ollama API error {response.status_code}: {response.text}")
-                    return None
-
-            except requests.exceptions.RequestException as e:
-                logger.error(f"Request error: {e}")
-                if attempt < max_retries - 1:
-                    time.sleep(retry_delay)
-                else:
-                    logger.error("Max retries reached due to request errors.")
-                    return None
-
-        return None
-
-    def _extract_json_from_response(self, content_text: str) -> List[str]:
+    def extract_use_cases(self, content: str, title: str = "") -> Optional[List[str]]:
         """
-        Extract the JSON list from the Ollama response content.
-        Handles responses wrapped in markdown code blocks.
+        Extract use cases from content using the model specified in config.
+        Returns None when the LLM call failed, so callers can tell it apart
+        from an article that has no use cases.
         """
-        if not content_text:
-            logger.error("Ollama response content is empty.")
+        if len(content.strip()) < config.MIN_CONTENT_LENGTH: # Use minimum length from config
+            logger.warning(f"Content too short ({len(content)} chars), skipping")
             return []
 
-        # Try to find a JSON array in the response, potentially within a markdown code block
-        # Look for code blocks with optional language specifier
-        code_block_pattern = r"```(?:json)?\s*\n?(.*?)\n?```"
-        match = re.search(code_block_pattern, content_text, re.DOTALL)
+        temperature = 0.1 # Lower temperature for more consistent results
 
-        json_str = ""
-        if match:
-            # Extract the content inside the code block
-            json_str = match.group(1).strip()
-            logger.debug(f"Extracted JSON string from code block: {json_str}")
-        else:
-            # If no code block is found, assume the entire response is the JSON string
-            json_str = content_text.strip()
-            logger.debug(f"No code block found, using full response as JSON string: {json_str}")
-
-        if not json_str:
-            logger.error("No content found inside potential JSON code block.")
-            return []
+        cache_key = None
+        if self.cache:
+            cache_key = LLMCache.make_key(self._cache_model(), config.USE_CASE_PROMPT_TEMPLATE, temperature,
+                                          title, content)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"Cache hit, reusing {len(cached)} use cases")
+                return cached
 
-        try:
-            # Attempt to parse the extracted string as JSON
-            parsed_data = json.loads(json_str)
-            if isinstance(parsed_data, list):
-                logger.info(f"Successfully parsed JSON list from Ollama response.")
-                return parsed_data
-            else:
-                logger.warning(f"Parsed JSON data is not a list: {parsed_data}")
-                return []
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse extracted string as JSON: {e}")
-            logger.error(f"Extracted string was: {json_str}")
-            return []
-        except Exception as e:
-            logger.error(f"Unexpected error during JSON extraction/parsing: {e}")
-            return []
+        # Trim the article so prompt and answer fit the context window
+        prompt, prompt_tokens = fit_prompt(config.USE_CASE_PROMPT_TEMPLATE, config.EXTRACTION_NUM_PREDICT,
+                                           title=title, content=content)
+        metrics.inc("prompt_tokens_estimated_total", prompt_tokens, kind="use_cases")
+        logger.info(f"Prompt ~{prompt_tokens} tokens, num_predict {config.EXTRACTION_NUM_PREDICT}")
 
+        if self.cascade_policy == "off":
+            use_cases = self._request_use_cases(self.model_name, prompt, temperature)
+        else:
+            use_cases = self._cascade(prompt, temperature, title, content)
 
-    def extract_use_cases(self, content: str, title: str = "") -> List[str]:
-        """Extract use cases from content using the model specified in config."""
-        if len(content.strip()) < config.MIN_CONTENT_LENGTH: # Use minimum length from config
-            logger.warning(f"Content too short ({len(content)} chars), skipping")
-            return []
+        # A valid empty list is cached too; only failed calls (None) are retried next time
+        if cache_key and use_cases is not None:
+            self.cache.set(cache_key, use_cases)
+        return use_cases
 
-        # Use the prompt template from config
-        prompt = config.USE_CASE_PROMPT_TEMPLATE.format(title=title, content=content)
+    def _cache_model(self) -> str:
+        """Model identity for cache keys; cascaded results may come from either model."""
+        if self.cascade_policy == "off":
+            return self.model_name
+        return f"{self.model_name}|{self.cascade_policy}:{self.small_model}"
 
+    def _request_use_cases(self, model: str, prompt: str, temperature: float,
+                           kind: str = "use_cases") -> Optional[List[str]]:
+        """Run an extraction prompt on `model`; None when no usable JSON list came back."""
         payload = {
-            "model": self.model_name, # Uses the model name from config
+            "model": model,
             "messages": [
                 {
                     "role": "user",
                     "content": prompt
                 }
             ],
-            "stream": False, # Ensure response is not streamed
+            "stream": config.OLLAMA_STREAM, # Stream and stop once the JSON list is complete
             "options": {
-                "temperature": 0.1 # Lower temperature for more consistent results
+                "temperature": temperature,
+                "num_predict": config.EXTRACTION_NUM_PREDICT
             }
         }
+        if config.OLLAMA_STRUCTURED_OUTPUT:
+            payload["format"] = STRING_LIST_SCHEMA
 
         response_data = self._make_request(payload)
+        if not response_data:
+            logger.error("No response received from Ollama API.")
+            return None
 
-        if response_data:
-            try:
-                # Access the 'message' -> 'content' field from the response object
-                content_text = response_data.get('message', {}).get('content', '')
-                # Use the new helper method to extract JSON
-                use_cases = self._extract_json_from_response(content_text)
-                return use_cases
+        # Access the 'message' -> 'content' field from the response object
+        content_text = response_data.get('message', {}).get('content', '')
+        parsed = parse_json(content_text, list, kind=kind)
+        return clean_string_list(parsed, kind) if parsed is not None else None
 
-            except Exception as e:
-                logger.error(f"Unexpected error processing Ollama response: {e}")
+    def _triage(self, title: str, content: str) -> Optional[bool]:
+        """Ask the small model whether the article is worth extracting; None if it gave no clear answer."""
+        prompt, _ = fit_prompt(config.TRIAGE_PROMPT_TEMPLATE, config.TRIAGE_NUM_PREDICT, title=title, content=content)
+        payload = {
+            "model": self.small_model,
+            "messages": [{"role": "user", "content": prompt}],
+            "stream": config.OLLAMA_STREAM,
+            "options": {"temperature": 0.0, "num_predict": config.TRIAGE_NUM_PREDICT}
+        }
+        if config.OLLAMA_STRUCTURED_OUTPUT:
+            payload["format"] = TRIAGE_SCHEMA
+
+        response_data = self._make_request(payload, expect=dict)
+        content_text = (response_data or {}).get('message', {}).get('content', '')
+        answer = (parse_json(content_text, dict, kind="triage") or {}).get('relevant')
+        return answer if isinstance(answer, bool) else None
+
+    @staticmethod
+    def _passes_validation(use_cases: Optional[List[str]]) -> bool:
+        """Whether the small model's use cases are good enough to keep without escalating."""
+        if use_cases is None:
+            return False
+        specific = [uc for uc in use_cases if len(uc.split()) >= config.CASCADE_MIN_USE_CASE_WORDS]
+        return len(specific) == len(use_cases) and len(specific) >= config.CASCADE_MIN_USE_CASES
+
+    def _cascade(self, prompt: str, temperature: float, title: str, content: str) -> Optional[List[str]]:
+        """
+        First pass on CASCADE_SMALL_MODEL, escalating to the configured model
+        only when needed. "validate" keeps the small model's use cases if they
+        pass validation; "triage" drops articles the small model rejects and
+        escalates the ones it flags. Unclear triage answers escalate too, so a
+        misbehaving small model costs time rather than use cases. Returns
+        None when the escalated call fails.
+        """
+        started = time.perf_counter()
+        if self.cascade_policy == "triage":
+            relevant = self._triage(title, content)
+            small_seconds = time.perf_counter() - started
+            if relevant is False:
+                logger.info(f"Small model rejected article in {small_seconds:.2f}s: {title[:80]}")
+                self._record_route("skipped", small_seconds)
                 return []
+            reason = "flagged" if relevant else "unclear"
         else:
-            logger.error("No response received from Ollama API.")
-            return []
+            use_cases = self._request_use_cases(self.small_model, prompt, temperature, kind="cascade")
+            small_seconds = time.perf_counter() - started
+            if self._passes_validation(use_cases):
+                self._record_route("accepted", small_seconds)
+                return use_cases
+            reason = "invalid"
+
+        logger.info(f"Escalating to {self.model_name} ({reason}): {title[:80]}")
+        started = time.perf_counter()
+        use_cases = self._request_use_cases(self.model_name, prompt, temperature)
+        self._record_route("escalated", small_seconds, time.perf_counter() - started, reason)
+        return use_cases
+
+    def _record_route(self, route: str, small_seconds: float, large_seconds: float = None, reason: str = None):
+        """
+        Count a cascade decision and estimate the time it saved. Articles the
+        small model settled saved the average large-model call time minus the
+        small call; escalations lost the small call. Savings and losses are
+        exported as separate counters. Until a large-model call has been
+        timed, settled articles wait in _unpriced.
+        """
+        labels = {'policy': self.cascade_policy, 'route': route}
+        if reason:
+            labels['reason'] = reason
+        metrics.inc("cascade_articles_total", **labels)
+        metrics.inc("cascade_model_seconds_total", small_seconds, model=self.small_model, role="small")
+        if large_seconds is not None:
+            metrics.inc("cascade_model_seconds_total", large_seconds, model=self.model_name, role="large")
+
+        with self._cascade_lock:
+            self._routes[route] += 1
+            # Each entry is one article's net effect; kept as two counters since counters never decrease
+            deltas = []
+            if large_seconds is None:
+                self._unpriced.append(small_seconds)
+            else:
+                self._large_seconds += large_seconds
+                self._large_calls += 1
+                deltas.append(-small_seconds)
+            if self._large_calls and self._unpriced:
+                average = self._large_seconds / self._large_calls
+                deltas.extend(average - seconds for seconds in self._unpriced)
+                self._unpriced = []
+            saved = sum(delta for delta in deltas if delta > 0)
+            lost = -sum(delta for delta in deltas if delta < 0)
+            self._seconds_saved += saved
+            self._seconds_lost += lost
+        if saved:
+            metrics.inc("cascade_seconds_saved_total", saved, policy=self.cascade_policy)
+        if lost:
+            metrics.inc("cascade_seconds_lost_total", lost, policy=self.cascade_policy)
+
+    def cascade_stats(self) -> str:
+        with self._cascade_lock:
+            total = sum(self._routes.values())
+            escalated = self._routes['escalated']
+            rate = (escalated / total * 100) if total else 0.0
+            return (f"{self.cascade_policy} via {self.small_model}: {total} articles, {escalated} escalated "
+                    f"({rate:.0f}%), {self._routes['accepted']} accepted, {self._routes['skipped']} skipped, "
+                    f"~{self._seconds_saved:.1f}s saved, ~{self._seconds_lost:.1f}s lost "
+                    f"(net {self._seconds_saved - self._seconds_lost:.1f}s)")
+
+    def plan_batches(self, articles: List[Dict]) -> List[List[int]]:
+        """
+        Group article indexes into batches that fit the batch token budget.
+        Batches are filled in order until adding the next article would exceed
+        config.EXTRACTION_BATCH_TOKEN_BUDGET or EXTRACTION_BATCH_MAX_ARTICLES,
+        or its text and answer would no longer fit the context window.
+        The cascade routes each article on its own, so every batch holds one
+        article while it is enabled.
+        """
+        if self.cascade_policy != "off":
+            return [[index] for index in range(len(articles))]
+
+        fixed = estimate_tokens(config.BATCH_USE_CASE_PROMPT_TEMPLATE.format(articles_block=""))
+        context_budget = context_window() - config.PROMPT_TOKEN_MARGIN - fixed
+        batches = []
+        current = []
+        current_tokens = 0
+
+        for index, article in enumerate(articles):
+            text = f"{article.get('title', '')}\n{article.get('content') or article.get('summary') or ''}"
+            tokens = estimate_tokens(text)
+            # Each article also needs room for its share of the answer
+            context_tokens = current_tokens + tokens + config.EXTRACTION_NUM_PREDICT * (len(current) + 1)
+
+            if current and (current_tokens + tokens > config.EXTRACTION_BATCH_TOKEN_BUDGET
+                            or context_tokens > context_budget
+                            or len(current) >= config.EXTRACTION_BATCH_MAX_ARTICLES):
+                batches.append(current)
+                current = []
+                current_tokens = 0
+
+            current.append(index)
+            current_tokens += tokens
+
+        if current:
+            batches.append(current)
+        return batches
+
+    def extract_use_cases_batch(self, items: List[Dict]) -> List[Optional[List[str]]]:
+        """
+        Extract use cases for several articles in a single request.
+        `items` are dicts with 'title' and 'content'; the result is a list of
+        use case lists aligned with `items` (None where extraction failed). Articles missing from the model
+        output, or with invalid entries, fall back to extract_use_cases.
+        With the cascade enabled every article goes through extract_use_cases.
+        """
+        if len(items) <= 1 or self.cascade_policy != "off":
+            return [self.extract_use_cases(item['content'], item['title']) for item in items]
+
+        temperature = 0.1
+        results: List[Optional[List[str]]] = [None] * len(items)
+        cache_keys = [None] * len(items)
+        pending = []
+
+        for index, item in enumerate(items):
+            if len(item['content'].strip()) < config.MIN_CONTENT_LENGTH:
+                logger.warning(f"Content too short ({len(item['content'])} chars), skipping")
+                results[index] = []
+                continue
+
+            if self.cache:
+                cache_keys[index] = LLMCache.make_key(self.model_name, config.BATCH_USE_CASE_PROMPT_TEMPLATE,
+                                                      temperature, item['title'], item['content'])
+                cached = self.cache.get(cache_keys[index])
+                if cached is None:
+                    # Articles extracted on their own (singletons, batch fallbacks) are cached per article
+                    cached = self.cache.get(LLMCache.make_key(self._cache_model(), config.USE_CASE_PROMPT_TEMPLATE,
+                                                              temperature, item['title'], item['content']))
+                if cached is not None:
+                    results[index] = cached
+                    continue
+
+            pending.append(index)
+
+        if len(pending) == 1:
+            index = pending[0]
+            results[index] = self.extract_use_cases(items[index]['content'], items[index]['title'])
+            pending = []
+
+        if pending:
+            # Article IDs are 1-based positions within this request
+            articles_block = "\n\n".join(
+                f"### Article {article_id}\nTitle: {items[index]['title']}\n\nContent:\n{items[index]['content']}"
+                for article_id, index in enumerate(pending, 1)
+            )
+            prompt = config.BATCH_USE_CASE_PROMPT_TEMPLATE.format(articles_block=articles_block)
+
+            payload = {
+                "model": self.model_name,
+                "messages": [{"role": "user", "content": prompt}],
+                "stream": config.OLLAMA_STREAM,
+                "options": {"temperature": temperature, "num_predict": config.EXTRACTION_NUM_PREDICT * len(pending)}
+            }
+            if config.OLLAMA_STRUCTURED_OUTPUT:
+                payload["format"] = keyed_lists_schema(len(pending))
+
+            logger.info(f"Extracting use cases for {len(pending)} articles in one request "
+                        f"(prompt ~{estimate_tokens(prompt)} tokens)")
+            response_data = self._make_request(payload, expect=dict)
+            content_text = (response_data or {}).get('message', {}).get('content', '')
+            parsed = parse_json(content_text, dict, kind="batch") or {}
+
+            for article_id, index in enumerate(pending, 1):
+                use_cases = parsed.get(str(article_id))
+                if isinstance(use_cases, list):
+                    use_cases = clean_string_list(use_cases, kind="batch")
+                    results[index] = use_cases
+                    if cache_keys[index]:
+                        self.cache.set(cache_keys[index], use_cases)
+
+            failed = [index for index in pending if results[index] is None]
+            if failed:
+                logger.warning(f"Batch output invalid for {len(failed)}/{len(pending)} articles, "
+                               f"falling back to per-article extraction")
+                for index in failed:
+                    results[index] = self.extract_use_cases(items[index]['content'], items[index]['title'])
+
+        return results
 
     def generate_product_ideas(self, use_cases: List[str]) -> List[str]:
         """Generate product ideas based on use cases using the model specified in config."""
@@ -156,7 +355,8 @@ class OllamaProcessor:
 
         # Use the prompt template from config
         use_cases_str = "\n".join([f"- {uc}" for uc in use_cases])
-        prompt = config.PRODUCT_IDEA_PROMPT_TEMPLATE.format(use_cases_str=use_cases_str)
+        prompt, _ = fit_prompt(config.PRODUCT_IDEA_PROMPT_TEMPLATE, config.PRODUCT_IDEA_NUM_PREDICT,
+                               "use_cases_str", use_cases_str=use_cases_str)
 
         payload = {
             "model": self.model_name, # Uses the model name from config
@@ -166,11 +366,14 @@ class OllamaProcessor:
                     "content": prompt
                 }
             ],
-            "stream": False,
+            "stream": config.OLLAMA_STREAM,
              "options": {
-                "temperature": 0.3 # Slightly higher for creativity, but still controlled
+                "temperature": 0.3, # Slightly higher for creativity, but still controlled
+                "num_predict": config.PRODUCT_IDEA_NUM_PREDICT
             }
         }
+        if config.OLLAMA_STRUCTURED_OUTPUT:
+            payload["format"] = STRING_LIST_SCHEMA
 
         response_data = self._make_request(payload)
 
@@ -178,8 +381,7 @@ class OllamaProcessor:
             try:
                 # Access the 'message' -> 'content' field from the response object
                 content_text = response_data.get('message', {}).get('content', '')
-                # Use the new helper method to extract JSON
-                product_ideas = self._extract_json_from_response(content_text)
+                product_ideas = parse_string_list(content_text, kind="product_ideas")
                 return product_ideas
 
             except Exception as e:
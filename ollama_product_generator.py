@@ -1,101 +1,153 @@
-import requests
-import json
 import logging
-import time
-import re
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
 import config
+from dedup import shingles, remove_near_duplicates
+from llm_json import STRING_LIST_SCHEMA, parse_string_list
+from ollama_client import get_client
+from token_budget import estimate_tokens, fit_prompt
 
 logger = logging.getLogger(__name__)
 
-def _extract_json_from_response(content_text: str) -> List[str]:
-    """Extract JSON list from Ollama response (handles markdown-wrapped responses)."""
-    if not content_text:
-        logger.error("Ollama response content is empty.")
-        return []
+def _request_ideas(prompt: str, temperature: float) -> List[str]:
+    """Send one idea-generation prompt and return the parsed JSON list."""
+    payload = {
+        "model": config.OLLAMA_MODEL,
+        "messages": [{"role": "user", "content": prompt}],
+        "stream": config.OLLAMA_STREAM,
+        "options": {"temperature": temperature, "num_predict": config.PRODUCT_IDEA_NUM_PREDICT}
+    }
+    if config.OLLAMA_STRUCTURED_OUTPUT:
+        payload["format"] = STRING_LIST_SCHEMA
 
-    # Match code block pattern
-    code_block_pattern = r"```(?:json)?\s*\n?(.*?)\n?```"
-    match = re.search(code_block_pattern, content_text, re.DOTALL)
-
-    json_str = match.group(1).strip() if match else content_text.strip()
-
-    try:
-        parsed_data = json.loads(json_str)
-        if isinstance(parsed_data, list):
-            logger.info(f"✅ Successfully parsed JSON with {len(parsed_data)} items.")
-            return parsed_data
-        else:
-            logger.warning("Parsed JSON is not a list.")
-            return []
-    except json.JSONDecodeError as e:
-        logger.error(f"❌ JSON parsing failed: {e}")
-        logger.error(f"Raw text: {json_str[:500]}")
-        return []
-    except Exception as e:
-        logger.error(f"Unexpected error while parsing JSON: {e}")
+    response_data = get_client().chat(payload)
+    if not response_data:
+        logger.error("No response received from Ollama API for product ideas.")
         return []
 
+    content_text = response_data.get("message", {}).get("content", "")
+    return parse_string_list(content_text, kind="product_ideas")
+
 
-def generate_product_ideas(use_case_strings: List[str]) -> List[str]:
-    """Generate creative product ideas based on a list of use cases."""
+def _ideas_for(use_case_strings: List[str]) -> List[str]:
+    use_cases_str = "\n".join([f"- {uc}" for uc in use_case_strings])
+    prompt, _ = fit_prompt(config.PRODUCT_IDEA_PROMPT_TEMPLATE, config.PRODUCT_IDEA_NUM_PREDICT,
+                           "use_cases_str", use_cases_str=use_cases_str)
+    return _request_ideas(prompt, 0.5)  # slightly more creative
+
+
+def cluster_use_cases(use_case_strings: List[str], max_size: int = None,
+                      token_budget: int = None) -> List[List[str]]:
+    """
+    Group related use cases into clusters bounded by count and estimated tokens.
+    Each use case is keyed on its most widespread topic word (ignoring words
+    that appear almost everywhere), so similar use cases sort next to each
+    other; the sorted list is then cut into bounded chunks. O(n log n).
+    """
+    max_size = max_size or config.PRODUCT_IDEA_CLUSTER_SIZE
+    token_budget = token_budget or config.PRODUCT_IDEA_MAP_TOKEN_BUDGET
+
+    word_sets = [shingles(uc, 1) for uc in use_case_strings]
+    document_frequency = Counter(word for words in word_sets for word in words)
+    too_common = max(2, int(len(use_case_strings) * 0.5))
+
+    def topic_key(words):
+        candidates = [w for w in words if document_frequency[w] < too_common]
+        if not candidates:
+            return (0, "")
+        best = max(candidates, key=lambda w: (document_frequency[w], w))
+        return (-document_frequency[best], best)
+
+    ordered = sorted(range(len(use_case_strings)), key=lambda i: (topic_key(word_sets[i]), i))
+
+    clusters = []
+    current = []
+    current_tokens = 0
+    for index in ordered:
+        tokens = estimate_tokens(use_case_strings[index])
+        if current and (len(current) >= max_size or current_tokens + tokens > token_budget):
+            clusters.append(current)
+            current = []
+            current_tokens = 0
+        current.append(use_case_strings[index])
+        current_tokens += tokens
+    if current:
+        clusters.append(current)
+    return clusters
+
+
+def _reduce_ideas(ideas: List[str]) -> List[str]:
+    """
+    Merge ideas until they fit a single reduce prompt, then consolidate them.
+    Oversized inputs are reduced in bounded groups first (in parallel), so no
+    single call sees more than PRODUCT_IDEA_REDUCE_BATCH ideas.
+    """
+    ideas = [record['idea'] for record in
+             remove_near_duplicates([{'idea': idea} for idea in ideas], key=lambda r: r['idea'], kind="idea")]
+
+    def merge(group: List[str]) -> List[str]:
+        ideas_str = "\n".join(f"- {idea}" for idea in group)
+        prompt, _ = fit_prompt(config.PRODUCT_IDEA_REDUCE_PROMPT_TEMPLATE, config.PRODUCT_IDEA_NUM_PREDICT,
+                               "ideas_str", ideas_str=ideas_str, max_ideas=config.PRODUCT_IDEA_MAX_FINAL)
+        # Keep the unmerged group if the merge call fails rather than losing it
+        return _request_ideas(prompt, 0.3) or group
+
+    batch = config.PRODUCT_IDEA_REDUCE_BATCH
+    while len(ideas) > batch:
+        groups = [ideas[i:i + batch] for i in range(0, len(ideas), batch)]
+        logger.info(f"Reducing {len(ideas)} ideas in {len(groups)} groups")
+        with ThreadPoolExecutor(max_workers=config.EXTRACTION_WORKERS) as executor:
+            merged = [idea for group_ideas in executor.map(merge, groups) for idea in group_ideas]
+        if len(merged) >= len(ideas):
+            # The model is not shrinking the list; stop instead of looping forever
+            ideas = merged[:batch]
+            break
+        ideas = merged
+
+    if len(ideas) <= 1:
+        return ideas
+    final = merge(ideas)
+    return [record['idea'] for record in
+            remove_near_duplicates([{'idea': idea} for idea in final], key=lambda r: r['idea'], kind="idea")]
+
+
+def generate_product_ideas_hierarchical(use_case_strings: List[str]) -> List[str]:
+    """
+    Map-reduce idea generation for large use case sets.
+    Use cases are clustered, ideas are generated per cluster in parallel
+    (map), then merged and deduplicated in a final pass (reduce). Every call
+    stays within a bounded prompt size regardless of the number of use cases.
+    """
+    clusters = cluster_use_cases(use_case_strings)
+    logger.info(f"Generating ideas for {len(use_case_strings)} use cases in {len(clusters)} clusters")
+
+    with ThreadPoolExecutor(max_workers=config.EXTRACTION_WORKERS) as executor:
+        cluster_ideas = list(executor.map(_ideas_for, clusters))
+
+    ideas = [idea for ideas in cluster_ideas for idea in ideas]
+    logger.info(f"Map stage produced {len(ideas)} ideas, merging...")
+    return _reduce_ideas(ideas)
+
+
+def generate_product_ideas(use_case_strings: List[str], hierarchical: bool = None) -> List[str]:
+    """
+    Generate creative product ideas based on a list of use cases.
+    Large inputs (more than PRODUCT_IDEA_CLUSTER_SIZE use cases) go through
+    the map-reduce path unless `hierarchical` is False.
+    """
     if not use_case_strings:
         logger.info("No use case strings provided, skipping idea generation.")
         return []
 
-    use_cases_str = "\n".join([f"- {uc}" for uc in use_case_strings])
-    prompt = config.PRODUCT_IDEA_PROMPT_TEMPLATE.format(use_cases_str=use_cases_str)
+    if hierarchical is None:
+        hierarchical = (config.PRODUCT_IDEA_HIERARCHICAL
+                        and len(use_case_strings) > config.PRODUCT_IDEA_CLUSTER_SIZE)
 
-    payload = {
-        "model": config.OLLAMA_MODEL,
-        "messages": [{"role": "user", "content": prompt}],
-        "stream": False,
-        "options": {"temperature": 0.5}  # slightly more creative
-    }
+    if hierarchical:
+        return generate_product_ideas_hierarchical(use_case_strings)
 
-    url = f"{config.OLLAMA_URL}/api/chat"
-    max_retries = 3
-    retry_delay = 5
-
-    for attempt in range(max_retries):
-        try:
-            response = requests.post(url, json=payload, timeout=config.OLLAMA_TIMEOUT)
-            logger.debug(f"Request payload: {payload}")
-            logger.debug(f"Ollama response status: {response.status_code}")
-
-            if response.status_code == 200:
-                response_data = response.json()
-                content_text = response_data.get("message", {}).get("content", "")
-                product_ideas = _extract_json_from_response(content_text)
-                return product_ideas
-
-            elif response.status_code == 404:
-                logger.error(f"Model {config.OLLAMA_MODEL} not found. Run: ollama pull {config.OLLAMA_MODEL}")
-                return []
-
-            elif response.status_code == 500:
-                logger.warning(f"Ollama 500 error (attempt {attempt + 1}). Retrying in {retry_delay}s...")
-                time.sleep(retry_delay)
-                continue
-
-            else:
-                logger.error(f"Ollama API error {response.status_code}: {response.text}")
-                return []
-
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Request error: {e}")
-            if attempt < max_retries - 1:
-                time.sleep(retry_delay)
-            else:
-                logger.error("Max retries reached due to network errors.")
-                return []
-
-        except Exception as e:
-            logger.error(f"Unexpected error during Ollama product idea generation: {e}")
-            return []
-
-    logger.error("Failed to get a valid response after retries.")
-    return []
+    return _ideas_for(use_case_strings)
 
 
 if __name__ == "__main__":
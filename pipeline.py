@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+import config
+from metrics import metrics
+from relevance import filter_relevant
+from scraper import FeedPoller, get_article_content
+
+logger = logging.getLogger(__name__)
+
+# Tells a stage's workers that upstream has finished
+_DONE = object()
+
+
+class StreamingPipeline:
+    """
+    Asyncio pipeline that streams articles from feed fetching into extraction.
+    Stages are connected by bounded asyncio.Queues, so a slow downstream stage
+    makes upstream stages wait instead of buffering the whole run:
+
+        fetch (FEED_FETCH_WORKERS) -> admit -> [full text (ARTICLE_FETCH_WORKERS)]
+            -> extract (EXTRACTION_WORKERS)
+
+    Admission applies the seen index, the relevance threshold and
+    MAX_ARTICLES_PER_RUN as each feed arrives, so the run cap takes the first
+    articles admitted rather than the highest priority ones, and
+    RELEVANCE_TOP_K (which needs every score) is not applied. The blocking
+    fetch and LLM calls run on a thread pool sized to the stage limits.
+    `on_result` receives None for an article whose extraction failed.
+    The feed state is not saved here: after run() the caller saves `poller`
+    once results are recorded, holding back `held_feeds` (feeds that had
+    articles cut by the run limit) along with any feeds whose extraction failed.
+    """
+
+    def __init__(self, extract: Callable[[Dict], Optional[List[Dict]]], seen_index=None,
+                 relevance_filter: bool = False, full_text: bool = False,
+                 on_article: Callable[[Dict], None] = None,
+                 on_result: Callable[[Dict, Optional[List[Dict]]], None] = None):
+        self.extract = extract
+        self.seen_index = seen_index
+        self.relevance_filter = relevance_filter
+        self.full_text = full_text
+        self.on_article = on_article
+        self.on_result = on_result
+
+        self.articles = []
+        self.latencies = []
+        self.skipped = {'seen': 0, 'duplicates': 0, 'irrelevant': 0, 'over_limit': 0}
+        self.poller = None
+        self.held_feeds = set()
+        self._batch_keys = (set(), set())
+        self._admitted = 0
+
+    def run(self) -> Tuple[List[Dict], List[float], Dict[str, int]]:
+        """Run the pipeline to completion; returns (articles, latencies, skipped counts)."""
+        asyncio.run(self._run())
+        return self.articles, self.latencies, self.skipped
+
+    async def _run(self):
+        poller = self.poller = FeedPoller()
+        if not poller.sources:
+            logger.info("No sources due for polling")
+            return
+
+        fetch_workers = max(1, min(config.FEED_FETCH_WORKERS, len(poller.sources)))
+        page_workers = max(1, config.ARTICLE_FETCH_WORKERS) if self.full_text else 0
+        extract_workers = max(1, config.EXTRACTION_WORKERS)
+        self._executor = ThreadPoolExecutor(max_workers=fetch_workers + page_workers + extract_workers)
+
+        extract_queue = asyncio.Queue(maxsize=config.PIPELINE_QUEUE_SIZE)
+        page_queue = asyncio.Queue(maxsize=config.PIPELINE_QUEUE_SIZE) if self.full_text else None
+        admit_queue = page_queue or extract_queue
+        sources = asyncio.Queue()
+        for source in poller.sources:
+            sources.put_nowait(source)
+
+        logger.info(f"Streaming {len(poller.sources)} feeds with {fetch_workers} fetch, {page_workers} page "
+                    f"and {extract_workers} extraction workers")
+        try:
+            fetchers = [asyncio.create_task(self._fetch_worker(poller, sources, admit_queue))
+                        for _ in range(fetch_workers)]
+            pagers = [asyncio.create_task(self._page_worker(page_queue, extract_queue, poller.limiter))
+                      for _ in range(page_workers)]
+            extractors = [asyncio.create_task(self._extract_worker(extract_queue))
+                          for _ in range(extract_workers)]
+
+            await asyncio.gather(*fetchers)
+            await self._finish(admit_queue, len(pagers) or len(extractors))
+            if pagers:
+                await asyncio.gather(*pagers)
+                await self._finish(extract_queue, len(extractors))
+            await asyncio.gather(*extractors)
+        finally:
+            self._executor.shutdown(wait=False)
+
+        logger.info(f"Pipeline admitted {self._admitted} articles "
+                    f"(skipped {self.skipped['seen']} seen, {self.skipped['duplicates']} duplicates, "
+                    f"{self.skipped['irrelevant']} off-topic, {self.skipped['over_limit']} over the run limit)")
+
+    async def _in_thread(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    @staticmethod
+    async def _finish(queue: asyncio.Queue, workers: int):
+        for _ in range(workers):
+            await queue.put(_DONE)
+
+    async def _fetch_worker(self, poller: FeedPoller, sources: asyncio.Queue, out: asyncio.Queue):
+        while not sources.empty():
+            source = sources.get_nowait()
+            with metrics.span("pipeline_stage", stage="fetch"):
+                feed_articles = await self._in_thread(poller.fetch, source)
+            # Admission runs on the loop thread, so its counters need no lock
+            for article in self._admit(feed_articles):
+                # Blocks while downstream stages are saturated
+                await out.put(article)
+
+    def _admit(self, feed_articles: List[Dict]) -> List[Dict]:
+        """Seen, relevance and run-limit filtering for one feed's articles"""
+        if self.seen_index and feed_articles:
+            feed_articles, seen, duplicates = self.seen_index.filter_new(feed_articles, self._batch_keys)
+            self.skipped['seen'] += seen
+            self.skipped['duplicates'] += duplicates
+
+        if self.relevance_filter and feed_articles:
+            feed_articles, irrelevant = filter_relevant(feed_articles, top_k=0)
+            self.skipped['irrelevant'] += irrelevant
+
+        room = max(0, config.MAX_ARTICLES_PER_RUN - self._admitted)
+        if len(feed_articles) > room:
+            self.skipped['over_limit'] += len(feed_articles) - room
+            self.held_feeds.update(a['feed_url'] for a in feed_articles[room:])
+            feed_articles = feed_articles[:room]
+        self._admitted += len(feed_articles)
+        return feed_articles
+
+    async def _page_worker(self, queue: asyncio.Queue, out: asyncio.Queue, limiter):
+        while True:
+            article = await queue.get()
+            if article is _DONE:
+                return
+            with metrics.span("pipeline_stage", stage="full_text"):
+                text = await self._in_thread(get_article_content, article.get('url'), limiter)
+            if text and len(text) > len(article.get('summary') or ''):
+                article['content'] = text
+            await out.put(article)
+
+    async def _extract_worker(self, queue: asyncio.Queue):
+        while True:
+            article = await queue.get()
+            if article is _DONE:
+                return
+
+            self.articles.append(article)
+            if self.on_article:
+                self.on_article(article)
+
+            started = time.perf_counter()
+            with metrics.span("pipeline_stage", stage="extract"):
+                try:
+                    use_cases = await self._in_thread(self.extract, article)
+                except Exception as e:
+                    logger.error(f"Error processing {article.get('title', '')[:80]}: {e}")
+                    use_cases = None
+            self.latencies.append(time.perf_counter() - started)
+
+            if self.on_result:
+                self.on_result(article, use_cases)
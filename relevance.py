@@ -0,0 +1,82 @@
+import logging
+import re
+import time
+from typing import Dict, List, Tuple
+import config
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+# Weighted terms for enterprise-AI relevance. Multi-word terms match as phrases.
+POSITIVE_TERMS = {
+    "enterprise": 2.0, "enterprises": 2.0, "business": 1.0, "businesses": 1.0, "workflow": 1.5,
+    "workflows": 1.5, "automation": 2.0, "automate": 1.5, "automated": 1.5, "agent": 1.0, "agents": 1.0,
+    "agentic": 1.5, "ai": 1.0, "llm": 1.0, "llms": 1.0, "language model": 1.0, "machine learning": 1.0,
+    "predictive": 1.5, "analytics": 1.5, "forecasting": 1.5, "compliance": 1.5, "document": 1.0,
+    "documents": 1.0, "contract": 1.5, "contracts": 1.5, "procurement": 2.0, "infrastructure": 1.5,
+    "construction": 2.0, "project management": 2.0, "maintenance": 1.5, "inspection": 1.5,
+    "supply chain": 1.5, "customer": 0.5, "productivity": 1.0, "deploy": 1.0, "deployment": 1.0,
+    "integration": 1.0, "api": 0.5, "copilot": 1.0, "assistant": 0.5, "use case": 2.0, "use cases": 2.0,
+    "government": 1.0, "public sector": 1.5, "risk": 1.0, "fraud": 1.0, "invoice": 1.5, "finance": 1.0,
+}
+NEGATIVE_TERMS = {
+    "raises": -2.0, "funding": -1.5, "funding round": -2.0, "series a": -2.0, "series b": -2.0,
+    "series c": -2.0, "seed round": -2.0, "valuation": -1.5, "ipo": -1.5, "investors": -1.0,
+    "hires": -1.5, "appoints": -2.0, "steps down": -2.0, "resigns": -2.0, "ceo": -0.5, "executive": -0.5,
+    "lawsuit": -1.5, "sues": -1.5, "layoffs": -1.0, "earnings": -1.0, "stock": -1.0, "podcast": -1.5,
+    "giveaway": -2.0, "deal": -0.5, "event": -0.5, "tickets": -2.0,
+}
+TERM_WEIGHTS = {**POSITIVE_TERMS, **NEGATIVE_TERMS}
+_MAX_TERM_WORDS = max(len(term.split()) for term in TERM_WEIGHTS)
+
+
+def _terms(text: str) -> set:
+    """All 1..n-word phrases of the text, for dictionary lookups."""
+    words = _WORD_RE.findall(text.lower())
+    found = set()
+    for n in range(1, _MAX_TERM_WORDS + 1):
+        for i in range(len(words) - n + 1):
+            phrase = " ".join(words[i:i + n])
+            if phrase in TERM_WEIGHTS:
+                found.add(phrase)
+    return found
+
+
+def score_article(article: Dict) -> float:
+    """Enterprise-AI relevance score; each term counts once, double if it appears in the title."""
+    title_terms = _terms(article.get('title', ''))
+    body_terms = _terms(article.get('content') or article.get('summary') or '')
+    return sum(TERM_WEIGHTS[term] * (2 if term in title_terms else 1) for term in title_terms | body_terms)
+
+
+def filter_relevant(articles: List[Dict], min_score: float = None, top_k: int = None) -> Tuple[List[Dict], int]:
+    """
+    Keep articles scoring at least `min_score`, then the `top_k` best of those.
+    Kept articles stay in their original (priority) order and carry their
+    score in 'relevance'. Returns (kept, skipped_count).
+    """
+    min_score = config.RELEVANCE_MIN_SCORE if min_score is None else min_score
+    top_k = config.RELEVANCE_TOP_K if top_k is None else top_k
+    started = time.perf_counter()
+
+    scored = []
+    for index, article in enumerate(articles):
+        article['relevance'] = round(score_article(article), 2)
+        if article['relevance'] >= min_score:
+            scored.append((article['relevance'], index))
+        else:
+            logger.info(f"Skipping off-topic article (score {article['relevance']}): {article.get('title', '')[:80]}")
+
+    if top_k and len(scored) > top_k:
+        scored = sorted(scored, key=lambda item: (-item[0], item[1]))[:top_k]
+
+    kept = [articles[index] for _, index in sorted(scored, key=lambda item: item[1])]
+    skipped = len(articles) - len(kept)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    metrics.inc("llm_calls_saved_total", skipped, reason="relevance")
+    logger.info(f"Relevance filter kept {len(kept)}/{len(articles)} articles in {elapsed_ms:.1f} ms "
+                f"({skipped} LLM calls saved)")
+    return kept, skipped
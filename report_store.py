@@ -0,0 +1,216 @@
+import argparse
+import glob
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+from datetime import datetime
+from typing import Dict, Iterator, List
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class ReportStore:
+    """
+    Append-only SQLite store of every use case and product idea found.
+    Rows are written as each stage produces them and are indexed on date,
+    source and URL, so "what did we find this month" is a range query
+    instead of parsing every daily_report_*.json file.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or config.REPORT_STORE_FILE
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                started_at TEXT NOT NULL,
+                origin TEXT
+            );
+            CREATE TABLE IF NOT EXISTS use_cases (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                run_id INTEGER NOT NULL REFERENCES runs(id),
+                created_at TEXT NOT NULL,
+                report_date TEXT NOT NULL,
+                product TEXT,
+                use_case TEXT NOT NULL,
+                source_article TEXT,
+                source_url TEXT,
+                source_name TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_use_cases_date ON use_cases(report_date);
+            CREATE INDEX IF NOT EXISTS idx_use_cases_source ON use_cases(source_name, report_date);
+            CREATE INDEX IF NOT EXISTS idx_use_cases_url ON use_cases(source_url);
+            CREATE TABLE IF NOT EXISTS product_ideas (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                run_id INTEGER NOT NULL REFERENCES runs(id),
+                created_at TEXT NOT NULL,
+                report_date TEXT NOT NULL,
+                idea TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_product_ideas_date ON product_ideas(report_date);
+            """
+        )
+        self._conn.commit()
+
+    def start_run(self, started_at: datetime = None, origin: str = "pipeline") -> int:
+        started_at = started_at or datetime.now()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO runs (started_at, origin) VALUES (?, ?)", (started_at.isoformat(), origin)
+            )
+            self._conn.commit()
+        return cursor.lastrowid
+
+    def add_use_cases(self, run_id: int, use_cases: List[Dict], created_at: datetime = None):
+        created_at = created_at or datetime.now()
+        rows = [
+            (run_id, created_at.isoformat(), created_at.date().isoformat(), uc.get('product'),
+             uc.get('use_case', ''), uc.get('source_article'), uc.get('source_url'), uc.get('source_name'))
+            for uc in use_cases if uc.get('use_case')
+        ]
+        with self._lock:
+            self._conn.executemany(
+                """
+                INSERT INTO use_cases (run_id, created_at, report_date, product, use_case,
+                                       source_article, source_url, source_name)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                rows
+            )
+            self._conn.commit()
+
+    def add_product_ideas(self, run_id: int, ideas: List[str], created_at: datetime = None):
+        created_at = created_at or datetime.now()
+        rows = [(run_id, created_at.isoformat(), created_at.date().isoformat(), str(idea)) for idea in ideas]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO product_ideas (run_id, created_at, report_date, idea) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+
+    def _query(self, table: str, start: str = None, end: str = None, **filters) -> Iterator[Dict]:
+        """Stream rows from `table` with report_date in [start, end] (YYYY-MM-DD)."""
+        clauses = []
+        params = []
+        if start:
+            clauses.append("report_date >= ?")
+            params.append(start)
+        if end:
+            clauses.append("report_date <= ?")
+            params.append(end)
+        for column, value in filters.items():
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        # A dedicated cursor iterates lazily, so exports never load everything at once
+        cursor = self._conn.cursor()
+        cursor.execute(f"SELECT * FROM {table} {where} ORDER BY report_date, id", params)
+        for row in cursor:
+            yield dict(row)
+
+    def query_use_cases(self, start: str = None, end: str = None, source: str = None,
+                        url: str = None) -> Iterator[Dict]:
+        return self._query("use_cases", start, end, source_name=source, source_url=url)
+
+    def query_product_ideas(self, start: str = None, end: str = None) -> Iterator[Dict]:
+        return self._query("product_ideas", start, end)
+
+    def export_jsonl(self, out, start: str = None, end: str = None, source: str = None) -> int:
+        """Stream matching use cases and ideas to a file object as JSON lines."""
+        count = 0
+        for row in self.query_use_cases(start, end, source):
+            out.write(json.dumps({'type': 'use_case', **row}, ensure_ascii=False) + "\n")
+            count += 1
+        if source is None:
+            for row in self.query_product_ideas(start, end):
+                out.write(json.dumps({'type': 'product_idea', **row}, ensure_ascii=False) + "\n")
+                count += 1
+        return count
+
+    def _already_ingested(self, origin: str) -> bool:
+        return self._conn.execute("SELECT 1 FROM runs WHERE origin = ? LIMIT 1", (origin,)).fetchone() is not None
+
+    def ingest_legacy_report(self, filename: str) -> bool:
+        """Import one daily_report_*.json file; files already imported are skipped."""
+        origin = f"legacy:{os.path.basename(filename)}"
+        if self._already_ingested(origin):
+            return False
+
+        with open(filename, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        try:
+            timestamp = datetime.fromisoformat(data.get('timestamp', ''))
+        except ValueError:
+            timestamp = datetime.fromtimestamp(os.path.getmtime(filename))
+
+        run_id = self.start_run(timestamp, origin)
+        self.add_use_cases(run_id, data.get('use_cases') or [], timestamp)
+        self.add_product_ideas(run_id, data.get('product_ideas') or [], timestamp)
+        return True
+
+    def ingest_legacy_reports(self, pattern: str = "daily_report_*.json") -> int:
+        imported = 0
+        for filename in sorted(glob.glob(pattern)):
+            try:
+                if self.ingest_legacy_report(filename):
+                    imported += 1
+                    logger.info(f"Imported {filename}")
+            except (OSError, ValueError) as e:
+                logger.error(f"Could not import {filename}: {e}")
+        return imported
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Query the AI News Agent report store")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    ingest = subparsers.add_parser('ingest', help="Import existing daily_report_*.json files")
+    ingest.add_argument('pattern', nargs='?', default="daily_report_*.json")
+
+    export = subparsers.add_parser('export', help="Stream use cases and ideas as JSON lines")
+    export.add_argument('--start', help="First report date (YYYY-MM-DD)")
+    export.add_argument('--end', help="Last report date (YYYY-MM-DD)")
+    export.add_argument('--source', help="Only use cases from this source")
+    export.add_argument('--output', '-o', help="Output file (default: stdout)")
+
+    for subparser in (ingest, export):
+        subparser.add_argument('--db', default=None, help="Store path (default: config.REPORT_STORE_FILE)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    store = ReportStore(args.db)
+
+    if args.command == 'ingest':
+        imported = store.ingest_legacy_reports(args.pattern)
+        logger.info(f"Imported {imported} report files into {store.path}")
+    else:
+        out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+        try:
+            count = store.export_jsonl(out, args.start, args.end, args.source)
+        finally:
+            if args.output:
+                out.close()
+        logger.info(f"Exported {count} records")
+
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
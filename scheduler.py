@@ -1,7 +1,10 @@
 import schedule
-import time
 import subprocess
 import logging
+import argparse
+import functools
+import signal
+import threading
 from datetime import datetime
 
 logging.basicConfig(
@@ -13,15 +16,25 @@ logging.basicConfig(
     ]
 )
 
-def run_news_agent():
-    """Run the news agent"""
+# Set while a run is in progress so scheduled runs never overlap
+_run_lock = threading.Lock()
+_stop_event = threading.Event()
+
+RUN_TIMEOUT = 3600  # 1 hour timeout
+
+
+def run_news_agent(resume_max_age=None):
+    """Run the news agent, resuming an interrupted run younger than `resume_max_age` seconds"""
     logging.info("Starting scheduled news agent run...")
+    command = ['python', 'main.py', '--resume']  # pick up a run killed by the timeout
+    if resume_max_age is not None:
+        command += ['--resume-max-age', str(resume_max_age)]
     try:
         result = subprocess.run(
-            ['python', 'main.py'],
+            command,
             capture_output=True,
             text=True,
-            timeout=3600  # 1 hour timeout
+            timeout=RUN_TIMEOUT
         )
         if result.returncode == 0:
             logging.info("News agent completed successfully!")
@@ -30,14 +43,129 @@ def run_news_agent():
     except Exception as e:
         logging.error(f"Error running news agent: {e}")
 
-# Schedule the job
-schedule.every().day.at("08:00").do(run_news_agent)  # Run at 8 AM daily
-# schedule.every(6).hours.do(run_news_agent)  # Alternative: every 6 hours
 
-logging.info("Scheduler started! Agent will run daily at 8:00 AM")
-logging.info("Press Ctrl+C to stop the scheduler")
+class InProcessAgent:
+    """
+    Runs main.main() inside the scheduler process.
+    The pipeline modules are imported once, and the OllamaProcessor (with its
+    pooled HTTP session and LLM cache) is reused for every run. Between runs
+    the model is kept loaded via Ollama's keep_alive.
+    """
+
+    def __init__(self, keep_alive, resume_max_age=None):
+        # Imported here so subprocess mode does not pay for these imports
+        import config
+        import main
+        import metrics
+        from ollama_processor import OllamaProcessor
+
+        self.config = config
+        self.metrics = metrics
+        self.main = main
+        # Also write the agent's own log file, as running main.py directly does
+        main.setup_logging()
+        self.keep_alive = keep_alive
+        self.resume_max_age = resume_max_age
+        self.ollama_proc = OllamaProcessor()
+
+    def warm(self):
+        if self.keep_alive is None:
+            return
+        if self.ollama_proc.client.keep_warm(self.ollama_proc.model_name, self.keep_alive):
+            logging.info(f"Model {self.ollama_proc.model_name} kept loaded for {self.keep_alive}")
+        else:
+            logging.warning("Could not warm up the Ollama model")
+
+    def run(self):
+        """Run the pipeline once, skipping the run if the previous one is still going"""
+        if not _run_lock.acquire(blocking=False):
+            logging.warning("Previous news agent run still in progress, skipping this one")
+            return
+
+        started = datetime.now()
+        logging.info("Starting in-process news agent run...")
+        try:
+            self.main.main(ollama_proc=self.ollama_proc, resume=True, resume_max_age=self.resume_max_age)
+            logging.info(f"News agent completed in {(datetime.now() - started).total_seconds():.1f}s")
+        except Exception as e:
+            logging.error(f"News agent run failed: {e}", exc_info=True)
+        finally:
+            _run_lock.release()
+            self.warm()
+
+    def run_async(self):
+        """Start a run on a worker thread so the scheduler loop stays responsive"""
+        threading.Thread(target=self.run, name="news-agent-run", daemon=True).start()
+
+
+def _request_stop(signum, frame):
+    logging.info(f"Received signal {signum}, shutting down after the current run...")
+    _stop_event.set()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Schedule the AI News Agent")
+    parser.add_argument('--daemon', action='store_true',
+                        help="Run the agent in this process and keep sessions, caches and the model warm")
+    parser.add_argument('--at', default="08:00",
+                        help="Daily run time (HH:MM), used unless --every-minutes is given")
+    parser.add_argument('--every-minutes', type=int,
+                        help="Run every N minutes instead of once a day")
+    parser.add_argument('--run-now', action='store_true',
+                        help="Also run once immediately at startup")
+    parser.add_argument('--keep-alive', default=None,
+                        help="Ollama keep_alive between daemon runs (e.g. '65m'); defaults to the interval plus 5 minutes")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # A run killed by the timeout or a crash is resumed by the next scheduled run, which
+    # starts up to an interval plus the run timeout after it (with 5 minutes of slack).
+    # Its new feed items wait for the following run; anything older is stale and discarded
+    resume_max_age = (args.every_minutes * 60 if args.every_minutes else 24 * 3600) + RUN_TIMEOUT + 300
+
+    if args.daemon:
+        keep_alive = args.keep_alive
+        if keep_alive is None:
+            keep_alive = f"{args.every_minutes + 5}m" if args.every_minutes else None
+        agent = InProcessAgent(keep_alive, resume_max_age)
+        if agent.config.METRICS_PORT:
+            agent.metrics.start_http_server(agent.config.METRICS_PORT)
+        job = agent.run_async
+        agent.warm()
+    else:
+        job = functools.partial(run_news_agent, resume_max_age)
+
+    # Schedule the job
+    if args.every_minutes:
+        schedule.every(args.every_minutes).minutes.do(job)
+        cadence = f"every {args.every_minutes} minutes"
+    else:
+        schedule.every().day.at(args.at).do(job)  # Run daily at the given time
+        cadence = f"daily at {args.at}"
+
+    signal.signal(signal.SIGINT, _request_stop)
+    signal.signal(signal.SIGTERM, _request_stop)
+
+    logging.info(f"Scheduler started ({'daemon' if args.daemon else 'subprocess'} mode)! Agent will run {cadence}")
+    logging.info("Press Ctrl+C to stop the scheduler")
+
+    if args.run_now:
+        job()
+
+    # Keep the scheduler running; sub-hourly cadences need a short tick
+    tick = 5 if args.every_minutes else 60
+    while not _stop_event.is_set():
+        schedule.run_pending()
+        _stop_event.wait(tick)
+
+    # Graceful shutdown: let an in-flight run finish before exiting
+    if _run_lock.locked():
+        logging.info("Waiting for the current run to finish...")
+    with _run_lock:
+        logging.info("Scheduler stopped")
+
 
-# Keep the scheduler running
-while True:
-    schedule.run_pending()
-    time.sleep(60)  # Check every minute
\ No newline at end of file
+if __name__ == "__main__":
+    main()
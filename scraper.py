@@ -1,68 +1,366 @@
 import feedparser
 import requests
+import requests.adapters
 from bs4 import BeautifulSoup
 import time
 import logging
 import ssl
+import os
+import json
+import threading
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+import config
+from metrics import metrics
+from sources import load_sources, due_sources
+from token_budget import trim_to_tokens
 
 logger = logging.getLogger(__name__)
 
-def get_tech_news():
-    """Get latest AI/tech news from RSS feeds"""
-    sources = {
-        "TechCrunch AI": "https://techcrunch.com/category/artificial-intelligence/feed/",
-        "MIT Tech Review": "https://www.technologyreview.com/topic/artificial-intelligence/feed",
-        "Ars Technica AI": "https://arstechnica.com/ai/feed/",
-    }
-    
+
+class HostRateLimiter:
+    """Enforce a minimum interval between requests to the same host."""
+
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._next_slot = {}
+
+    def wait(self, url: str):
+        host = urlparse(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.min_interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+def _load_feed_state():
+    """Load stored ETag/Last-Modified validators keyed by feed URL"""
+    if not os.path.exists(config.FEED_STATE_FILE):
+        return {}
+    try:
+        with open(config.FEED_STATE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read feed state, starting fresh: {e}")
+        return {}
+
+
+def _save_feed_state(state):
+    """Write feed validators atomically so a crash never leaves a torn file"""
+    tmp_path = f"{config.FEED_STATE_FILE}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, config.FEED_STATE_FILE)
+    except OSError as e:
+        logger.error(f"Error saving feed state: {e}")
+
+
+def _parse_entries(name, feed, max_entries=None):
+    """Turn feed entries into article dicts"""
     articles = []
 
-    for name, url in sources.items():
+    for entry in feed.entries[:max_entries or config.MAX_ARTICLES_PER_SOURCE]:
         try:
-            logger.info(f"Fetching from {name}...")
+            title = getattr(entry, 'title', '')
+            link = getattr(entry, 'link', '')
+            summary = getattr(entry, 'summary', '')
             
-            if hasattr(ssl, '_create_unverified_context'):
-                ssl._create_default_https_context = ssl._create_unverified_context
+            if not title or not summary:
+                continue
             
-            headers = {'User-Agent': 'Mozilla/5.0'}
-            feed = feedparser.parse(url, request_headers=headers)
+            # Clean HTML from summary
+            soup = BeautifulSoup(summary, 'html.parser')
+            clean_summary = soup.get_text(separator=' ', strip=True)
             
-            logger.info(f"Found {len(feed.entries)} entries")
-            
-            for entry in feed.entries[:5]:
-                try:
-                    title = getattr(entry, 'title', '')
-                    link = getattr(entry, 'link', '')
-                    summary = getattr(entry, 'summary', '')
-                    
-                    if not title or not summary:
-                        continue
-                    
-                    # Clean HTML from summary
-                    soup = BeautifulSoup(summary, 'html.parser')
-                    clean_summary = soup.get_text(separator=' ', strip=True)
-                    
-                    articles.append({
-                        'source': name,
-                        'title': title,
-                        'url': link,
-                        'summary': clean_summary,
-                        'content': clean_summary  # Use summary as content
-                    })
-                    logger.info(f"Added: {title[:80]}")
-                    
-                except Exception as e:
-                    logger.error(f"Error processing entry: {e}")
-            
-            time.sleep(1)
+            articles.append({
+                'source': name,
+                'title': title,
+                'url': link,
+                'summary': clean_summary,
+                'content': clean_summary  # Use summary as content
+            })
+            logger.info(f"Added: {title[:80]}")
             
         except Exception as e:
-            logger.error(f"Error fetching {name}: {e}")
+            logger.error(f"Error processing entry: {e}")
+
+    return articles
+
+
+def _fetch_feed(source, validators, limiter):
+    """
+    Fetch and parse a single feed with a conditional GET.
+    Returns (articles, new_validators, ok); new_validators is None when the
+    stored ones should be kept, ok is False when the fetch failed.
+    """
+    name = source['name']
+    url = source['url']
+    try:
+        limiter.wait(url)
+        logger.info(f"Fetching from {name}...")
+        
+        headers = {'User-Agent': 'Mozilla/5.0'}
+        with metrics.span("feed_fetch", feed=name) as labels:
+            feed = feedparser.parse(
+                url,
+                request_headers=headers,
+                etag=validators.get('etag'),
+                modified=validators.get('modified')
+            )
+            labels['status'] = getattr(feed, 'status', 'error')
+        metrics.inc("feed_fetches_total", feed=name, status=getattr(feed, 'status', 'error'))
+        
+        if getattr(feed, 'status', None) == 304:
+            logger.info(f"{name} unchanged since last fetch (304), skipping")
+            return [], None, True
+        
+        logger.info(f"Found {len(feed.entries)} entries")
+        
+        new_validators = None
+        if feed.entries:
+            new_validators = {
+                'etag': getattr(feed, 'etag', None),
+                'modified': getattr(feed, 'modified', None)
+            }
+        
+        with metrics.span("html_clean", feed=name):
+            articles = _parse_entries(name, feed, source.get('max_entries'))
+        metrics.inc("feed_articles_total", len(articles), feed=name)
+        return articles, new_validators, True
+        
+    except Exception as e:
+        metrics.inc("feed_fetch_errors_total", feed=name)
+        logger.error(f"Error fetching {name}: {e}")
+        return [], None, False
+
+
+class FeedPoller:
+    """
+    One polling pass over the source registry. Picks the sources that are
+    due, fetches each with conditional GET and per-host rate limiting, and
+    holds the new validators and poll time of every feed that succeeded
+    until save(). Saving them tells the next run the feed's articles were
+    dealt with, so callers save only after extraction and pass the feeds
+    with unfinished articles (failed or over the run limit) as `hold`,
+    which keeps their old validators so those articles are fetched again.
+    Each article carries its feed in 'feed_url'.
+    fetch() is thread-safe.
+    """
+    
+    def __init__(self, sources=None, only_due: bool = True):
+        if sources is None:
+            sources = load_sources()
+        
+        if hasattr(ssl, '_create_unverified_context'):
+            ssl._create_default_https_context = ssl._create_unverified_context
+        
+        self.state = _load_feed_state()
+        self.limiter = HostRateLimiter(config.FEED_HOST_MIN_INTERVAL)
+        self._pending = {}
+        self._lock = threading.Lock()
+        
+        if only_due:
+            due = due_sources(sources, self.state)
+            if len(due) < len(sources):
+                logger.info(f"Polling {len(due)}/{len(sources)} sources that are due")
+            sources = due
+        self.sources = sources
+    
+    def fetch(self, source):
+        """Fetch one source's articles and hold its new validators until save()"""
+        with self._lock:
+            validators = dict(self.state.get(source['url'], {}))
+        
+        articles, new_validators, ok = _fetch_feed(source, validators, self.limiter)
+        for article in articles:
+            article['feed_url'] = source['url']
+        
+        if ok:
+            with self._lock:
+                update = dict(new_validators or {})
+                update['last_polled'] = time.time()
+                self._pending[source['url']] = update
+        return articles
+    
+    def save(self, hold=()):
+        """Record the held-back feed updates, except for the feed URLs in `hold`"""
+        hold = set(hold)
+        with self._lock:
+            for url, update in self._pending.items():
+                if url in hold:
+                    logger.info(f"Keeping previous feed state for {url} so its unfinished articles are refetched")
+                    continue
+                self.state.setdefault(url, {}).update(update)
+            self._pending = {}
+            _save_feed_state(self.state)
+
+
+def get_tech_news(concurrent: bool = None, sources=None, only_due: bool = True, poller=None):
+    """
+    Get latest AI/tech news from the RSS feeds in the source registry.
+    Only sources whose poll interval has elapsed are fetched unless
+    only_due is False. Articles come back ordered by source priority.
+    A caller passing its own FeedPoller saves it once the articles are
+    processed; otherwise the feed state is saved right away.
+    """
+    if concurrent is None:
+        concurrent = config.FEED_FETCH_CONCURRENT
+    
+    owns_poller = poller is None
+    if owns_poller:
+        poller = FeedPoller(sources, only_due)
+    if not poller.sources:
+        logger.info("No sources due for polling")
+        return []
+    
+    if concurrent:
+        workers = max(1, min(config.FEED_FETCH_WORKERS, len(poller.sources)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # map() keeps results in source order regardless of completion order
+            results = list(executor.map(poller.fetch, poller.sources))
+    else:
+        results = [poller.fetch(source) for source in poller.sources]
+    
+    articles = [article for feed_articles in results for article in feed_articles]
+    if owns_poller:
+        poller.save()
     
     logger.info(f"Total articles found: {len(articles)}")
     return articles
 
 
-def get_article_content(url):
-    """Deprecated - using RSS summaries instead"""
-    return None
\ No newline at end of file
+_page_session = None
+_page_session_lock = threading.Lock()
+
+# Elements that never hold article body text
+_BOILERPLATE_TAGS = ['script', 'style', 'noscript', 'nav', 'header', 'footer', 'aside', 'form', 'figure', 'iframe']
+
+
+def _get_page_session():
+    """Shared keep-alive session for article downloads"""
+    global _page_session
+    with _page_session_lock:
+        if _page_session is None:
+            _page_session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=config.ARTICLE_FETCH_WORKERS,
+                                                    pool_maxsize=config.ARTICLE_FETCH_WORKERS)
+            _page_session.mount('http://', adapter)
+            _page_session.mount('https://', adapter)
+            _page_session.headers['User-Agent'] = 'Mozilla/5.0'
+        return _page_session
+
+
+def _page_cache_path(url):
+    return os.path.join(config.ARTICLE_CACHE_DIR, hashlib.sha256(url.encode('utf-8')).hexdigest() + '.json')
+
+
+def _read_page_cache(url):
+    path = _page_cache_path(url)
+    try:
+        if time.time() - os.path.getmtime(path) > config.ARTICLE_CACHE_TTL:
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f).get('text')
+    except (OSError, ValueError):
+        return None
+
+
+def _write_page_cache(url, text):
+    path = _page_cache_path(url)
+    try:
+        os.makedirs(config.ARTICLE_CACHE_DIR, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'url': url, 'text': text}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Could not cache article {url}: {e}")
+
+
+def extract_main_text(html):
+    """
+    Extract the main body text of an article page with the lxml parser.
+    Prefers an <article> element; otherwise picks the container whose direct
+    paragraphs hold the most text.
+    """
+    soup = BeautifulSoup(html, 'lxml')
+    for tag in soup(_BOILERPLATE_TAGS):
+        tag.decompose()
+
+    # Score containers by the text of their own paragraphs, so outer wrapper
+    # divs do not win just by containing everything
+    best = soup.find('article')
+    if best is None:
+        best_length = 0
+        for candidate in soup.find_all(['main', 'section', 'div']):
+            length = sum(len(p.get_text(strip=True)) for p in candidate.find_all('p', recursive=False))
+            if length > best_length:
+                best, best_length = candidate, length
+
+    root = best or soup.body or soup
+    paragraphs = [p.get_text(separator=' ', strip=True) for p in root.find_all('p')]
+    text = '\n'.join(p for p in paragraphs if p)
+    return text or root.get_text(separator=' ', strip=True)
+
+
+def truncate_to_budget(text, max_tokens=None):
+    """Cut text to roughly max_tokens, ending on a sentence or word"""
+    return trim_to_tokens(text, max_tokens or config.ARTICLE_MAX_TOKENS)
+
+
+def get_article_content(url, limiter=None):
+    """Download an article page and return its main text, truncated to the token budget"""
+    if not url:
+        return None
+
+    cached = _read_page_cache(url)
+    if cached is not None:
+        metrics.inc("article_cache_hits_total")
+        return cached
+
+    try:
+        if limiter:
+            limiter.wait(url)
+        with metrics.span("article_fetch"):
+            response = _get_page_session().get(url, timeout=config.REQUEST_TIMEOUT, verify=False)
+        metrics.inc("article_fetches_total", status=response.status_code)
+        if response.status_code != 200:
+            logger.warning(f"Article fetch returned {response.status_code}: {url}")
+            return None
+
+        with metrics.span("article_extract"):
+            text = truncate_to_budget(extract_main_text(response.content))
+        _write_page_cache(url, text)
+        return text
+
+    except Exception as e:
+        logger.error(f"Error fetching article {url}: {e}")
+        return None
+
+
+def fetch_full_articles(articles):
+    """
+    Replace RSS summaries with full article text, downloading pages
+    concurrently. Articles whose page cannot be fetched, or yields less
+    text than the summary, keep the summary. Returns the number upgraded.
+    """
+    limiter = HostRateLimiter(config.FEED_HOST_MIN_INTERVAL)
+    workers = max(1, min(config.ARTICLE_FETCH_WORKERS, len(articles)))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        texts = list(executor.map(lambda a: get_article_content(a.get('url'), limiter), articles))
+
+    upgraded = 0
+    for article, text in zip(articles, texts):
+        if text and len(text) > len(article.get('summary') or ''):
+            article['content'] = text
+            upgraded += 1
+
+    logger.info(f"Fetched full text for {upgraded}/{len(articles)} articles")
+    return upgraded
@@ -0,0 +1,151 @@
+import hashlib
+import logging
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Tuple
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+import config
+
+logger = logging.getLogger(__name__)
+
+# Query parameters that only carry tracking information
+_TRACKING_PARAMS = {"fbclid", "gclid", "mc_cid", "mc_eid", "ref", "ref_src", "guccounter", "cmpid"}
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def canonicalize_url(url: str) -> str:
+    """Normalize a URL so the same article linked in different ways maps to one key."""
+    if not url:
+        return ""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith("utm_") and k.lower() not in _TRACKING_PARAMS
+    )
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit(("https" if parts.scheme in ("http", "https") else parts.scheme,
+                       host, path, urlencode(query), ""))
+
+
+def fingerprint(title: str, summary: str = "") -> str:
+    """Hash of the normalized title; short titles also take the start of the summary."""
+    words = _WORD_RE.findall((title or "").lower())
+    if len(words) < 4:
+        words += _WORD_RE.findall((summary or "").lower())[:30]
+    return hashlib.sha256(" ".join(words).encode("utf-8")).hexdigest()
+
+
+class SeenArticleIndex:
+    """
+    Persistent index of articles handled on earlier runs, stored in SQLite.
+    Articles are matched on canonical URL or on their title fingerprint, so
+    stories cross-posted by several sources are only extracted once.
+    """
+
+    def __init__(self, path: str = None, retention_days: int = None):
+        self.path = path or config.SEEN_INDEX_FILE
+        self.retention_days = retention_days if retention_days is not None else config.SEEN_INDEX_RETENTION_DAYS
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS seen_articles (
+                url TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                title TEXT,
+                source TEXT,
+                first_seen REAL NOT NULL,
+                last_seen REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_seen_fingerprint ON seen_articles(fingerprint)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_seen_last_seen ON seen_articles(last_seen)")
+        self._conn.commit()
+
+    @staticmethod
+    def _keys(article: Dict) -> Tuple[str, str]:
+        fp = fingerprint(article.get('title', ''), article.get('summary', ''))
+        # Articles without a link are keyed on their fingerprint alone
+        url = canonicalize_url(article.get('url', '')) or f"fp:{fp}"
+        return url, fp
+
+    def _is_seen(self, url: str, fp: str) -> bool:
+        row = self._conn.execute(
+            "SELECT 1 FROM seen_articles WHERE url = ? OR fingerprint = ? LIMIT 1", (url, fp)
+        ).fetchone()
+        return row is not None
+
+    def filter_new(self, articles: List[Dict], batch_keys: Tuple[set, set] = None) -> Tuple[List[Dict], int, int]:
+        """
+        Drop articles handled on earlier runs and duplicates within this batch.
+        Callers filtering a run feed by feed pass the same `batch_keys`
+        (a pair of empty sets) to every call so duplicates across feeds are
+        caught too. Returns (new_articles, skipped_seen, skipped_duplicates).
+        """
+        new_articles = []
+        skipped_seen = 0
+        skipped_duplicates = 0
+        batch_urls, batch_fps = batch_keys or (set(), set())
+
+        with self._lock:
+            for article in articles:
+                url, fp = self._keys(article)
+
+                if self._is_seen(url, fp):
+                    # Keep articles that are still in a feed from aging out of the index
+                    self._conn.execute(
+                        "UPDATE seen_articles SET last_seen = ? WHERE url = ? OR fingerprint = ?",
+                        (time.time(), url, fp)
+                    )
+                    skipped_seen += 1
+                    continue
+                if url in batch_urls or fp in batch_fps:
+                    logger.info(f"Skipping cross-posted duplicate: {article.get('title', '')[:80]}")
+                    skipped_duplicates += 1
+                    continue
+
+                batch_urls.add(url)
+                batch_fps.add(fp)
+                new_articles.append(article)
+
+            self._conn.commit()
+
+        return new_articles, skipped_seen, skipped_duplicates
+
+    def mark_processed(self, articles: List[Dict]):
+        """Record articles as handled so later runs skip them."""
+        now = time.time()
+        with self._lock:
+            for article in articles:
+                url, fp = self._keys(article)
+                self._conn.execute(
+                    """
+                    INSERT INTO seen_articles (url, fingerprint, title, source, first_seen, last_seen)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(url) DO UPDATE SET last_seen = excluded.last_seen
+                    """,
+                    (url, fp, article.get('title', ''), article.get('source', ''), now, now)
+                )
+            self._conn.commit()
+
+    def prune(self) -> int:
+        """Forget articles not seen within the retention window."""
+        if not self.retention_days:
+            return 0
+        cutoff = time.time() - self.retention_days * 86400
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM seen_articles WHERE last_seen < ?", (cutoff,))
+            self._conn.commit()
+        if cursor.rowcount:
+            logger.info(f"Pruned {cursor.rowcount} articles older than {self.retention_days} days from seen index")
+        return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,82 @@
+import logging
+import os
+import time
+from typing import Dict, List
+import config
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    import tomli as tomllib
+
+logger = logging.getLogger(__name__)
+
+# Used when no sources file exists, matching the original hardcoded feeds
+DEFAULT_SOURCES = [
+    {"name": "TechCrunch AI", "url": "https://techcrunch.com/category/artificial-intelligence/feed/"},
+    {"name": "MIT Tech Review", "url": "https://www.technologyreview.com/topic/artificial-intelligence/feed"},
+    {"name": "Ars Technica AI", "url": "https://arstechnica.com/ai/feed/"},
+]
+
+_FIELDS = {"name", "url", "priority", "poll_interval_minutes", "max_entries", "enabled"}
+
+
+def _normalize(raw: Dict) -> Dict:
+    unknown = set(raw) - _FIELDS
+    if unknown:
+        logger.warning(f"Ignoring unknown fields {sorted(unknown)} in source {raw.get('name', raw.get('url'))}")
+    if not raw.get("name") or not raw.get("url"):
+        raise ValueError(f"Source needs both 'name' and 'url': {raw}")
+    return {
+        "name": raw["name"],
+        "url": raw["url"],
+        "priority": int(raw.get("priority", 0)),
+        "poll_interval_minutes": float(raw.get("poll_interval_minutes", config.DEFAULT_POLL_INTERVAL_MINUTES)),
+        "max_entries": int(raw.get("max_entries", config.MAX_ARTICLES_PER_SOURCE)),
+        "enabled": bool(raw.get("enabled", True)),
+    }
+
+
+def load_sources(path: str = None, include_disabled: bool = False) -> List[Dict]:
+    """
+    Load feed sources from the TOML registry, highest priority first.
+    Each [[source]] table has name, url and optional priority,
+    poll_interval_minutes, max_entries and enabled fields.
+    """
+    path = path or config.SOURCES_FILE
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            raw_sources = tomllib.load(f).get("source", [])
+    else:
+        logger.warning(f"Sources file {path} not found, using built-in defaults")
+        raw_sources = DEFAULT_SOURCES
+
+    sources = []
+    seen_urls = set()
+    for raw in raw_sources:
+        source = _normalize(raw)
+        if source["url"] in seen_urls:
+            logger.warning(f"Duplicate source URL skipped: {source['url']}")
+            continue
+        seen_urls.add(source["url"])
+        if source["enabled"] or include_disabled:
+            sources.append(source)
+
+    # Stable sort keeps file order among equal priorities
+    sources.sort(key=lambda s: -s["priority"])
+    return sources
+
+
+def due_sources(sources: List[Dict], state: Dict, now: float = None) -> List[Dict]:
+    """
+    Sources whose poll interval has elapsed since their last successful poll.
+    A small slack keeps a source polled every 24h due for a daily run that
+    starts a few seconds earlier than yesterday's.
+    """
+    now = now or time.time()
+    due = []
+    for source in sources:
+        last_polled = state.get(source["url"], {}).get("last_polled", 0)
+        if now - last_polled >= source["poll_interval_minutes"] * 60 - config.POLL_INTERVAL_SLACK_SECONDS:
+            due.append(source)
+    return due
@@ -0,0 +1,66 @@
+import logging
+import re
+from typing import Tuple
+import config
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Local token estimate without loading a tokenizer.
+    Subword tokenizers average about 4 characters per token on English prose
+    but split punctuation, numbers and rare words more finely, so the larger
+    of the character-based and word-based estimates is used.
+    """
+    if not text:
+        return 0
+    return max(len(text) // 4, int(len(_WORD_RE.findall(text)) * 1.2)) + 1
+
+
+def trim_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to about max_tokens, keeping the lead and ending on a sentence or word."""
+    if max_tokens <= 0:
+        return ""
+    tokens = estimate_tokens(text)
+    if tokens <= max_tokens:
+        return text
+
+    # Scale by this text's own characters-per-token ratio
+    max_chars = int(len(text) * max_tokens / tokens)
+    cut = text[:max_chars]
+    boundary = max(cut.rfind('. '), cut.rfind('\n'))
+    if boundary < max_chars // 2:
+        boundary = cut.rfind(' ')
+    return cut[:boundary + 1].rstrip() if boundary > 0 else cut
+
+
+def context_window() -> int:
+    """Tokens the model will be run with; Ollama's default when OLLAMA_NUM_CTX is unset."""
+    return config.OLLAMA_NUM_CTX or 2048
+
+
+def fit_prompt(template: str, num_predict: int, trim_field: str = "content", **fields) -> Tuple[str, int]:
+    """
+    Format `template` with fields[trim_field] trimmed so the prompt plus
+    `num_predict` output tokens fit the context window, less
+    PROMPT_TOKEN_MARGIN for estimation error. Ollama silently drops the
+    start of an over-long prompt, which would cut the instructions rather
+    than the article. Returns (prompt, estimated_prompt_tokens).
+    """
+    text = fields.pop(trim_field)
+    fixed = estimate_tokens(template.format(**{trim_field: ""}, **fields))
+    available = context_window() - num_predict - config.PROMPT_TOKEN_MARGIN - fixed
+
+    text_tokens = estimate_tokens(text)
+    if text_tokens > available:
+        text = trim_to_tokens(text, available)
+        metrics.inc("prompt_trims_total", field=trim_field)
+        logger.info(f"Trimmed {trim_field} from ~{text_tokens} to ~{estimate_tokens(text)} tokens "
+                    f"to fit num_ctx {context_window()}")
+
+    prompt = template.format(**{trim_field: text}, **fields)
+    return prompt, estimate_tokens(prompt)